@@ -0,0 +1,267 @@
+# Usage from the repository root: python -m bench.benchmark --levels 1 4 16 64
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from patchright.async_api import (
+    BrowserContext,
+    Playwright,
+    Request,
+    Route,
+    async_playwright,
+)
+
+from .fake_proxy import FakeProxy
+from src.managers.rabby_wallet_pw.types import ParsedWithUserData
+from src.process_stats import get_process_tree_pss
+from src.runner import AccountRunner
+from src.tracing import load_step_durations, percentile
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKE_RABBY_PATH = os.path.join(BENCH_DIR, 'fake_rabby')
+FAKE_OPENION_PATH = os.path.join(BENCH_DIR, 'fake_openion')
+REFERRAL_URL = 'https://openion.com/i/bench'
+LEVELS = (1, 4, 16, 64)
+BENCH_PRIVATE_KEY = '0x' + '11' * 32
+BENCH_PASSWORD = 'BenchPassword1!'
+
+
+logger = logging.getLogger('bench')
+
+
+def get_unpacked_extension_id(path: str) -> str:
+    # Chromium derives the id of an unpacked extension without a key from
+    # its absolute path: sha256, first 16 bytes, hex digits mapped to a-p
+    digest = hashlib.sha256(os.path.realpath(path).encode()).hexdigest()[:32]
+    return ''.join(chr(ord('a') + int(char, 16)) for char in digest)
+
+
+def read_stand_in(name: str) -> str:
+    with open(os.path.join(FAKE_OPENION_PATH, name)) as stand_in:
+        return stand_in.read()
+
+
+async def serve_openion(browser_context: BrowserContext) -> None:
+    index_html = read_stand_in('index.html')
+    account_html = read_stand_in('account.html')
+    app_js = read_stand_in('app.js')
+
+    async def handle(route: Route, request: Request) -> None:
+        path = urlparse(request.url).path
+
+        if path == '/assets/app.js':
+            await route.fulfill(
+                status=200,
+                headers={'cache-control': 'public, max-age=3600'},
+                content_type='application/javascript',
+                body=app_js,
+            )
+        elif path.startswith('/account'):
+            await route.fulfill(
+                status=200,
+                content_type='text/html',
+                body=account_html.format(ref_code=uuid.uuid4().hex[:10]),
+            )
+        else:
+            await route.fulfill(
+                status=200,
+                content_type='text/html',
+                body=index_html,
+            )
+
+    await browser_context.route('https://openion.com/**', handle)
+
+
+async def sample_peak_rss(
+    stop: asyncio.Event,
+    interval: float = 0.5,
+) -> int:
+    peak = 0
+
+    while not stop.is_set():
+        rss = await asyncio.to_thread(get_process_tree_pss, os.getpid())
+        peak = max(peak, rss)
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+    return peak
+
+
+def make_accounts(
+    level: int,
+    count: int,
+) -> List[ParsedWithUserData]:
+    return [
+        {
+            'serial_number': f'bench-{level}-{index}',
+            'user_id': f'bench-{level}-{index}',
+            'private_key': BENCH_PRIVATE_KEY,
+            'password': BENCH_PASSWORD,
+        }
+        for index in range(count)
+    ]
+
+
+async def run_level(
+    pw: Playwright,
+    level: int,
+    accounts_per_worker: int,
+    headless: bool,
+    work_dir: str,
+    proxy: Optional[str] = None,
+    launch_profile: str = 'default',
+) -> Dict[str, Any]:
+    trace_path = os.path.join(work_dir, f'trace-{level}.jsonl')
+    runner = AccountRunner(
+        playwright=pw,
+        config={
+            'logger': logger,
+            'extension_path': FAKE_RABBY_PATH,
+            'referral_url': REFERRAL_URL,
+            'store_identificator': get_unpacked_extension_id(FAKE_RABBY_PATH),
+            'workers': level,
+            'headless': headless,
+            'launch_profile': launch_profile,
+            'measure_memory': True,
+            'user_data_root': work_dir,
+            'trace_path': trace_path,
+            'on_context_launch': serve_openion,
+            # The stand-in proxy tunnels its own probes back to itself
+            'proxies': [proxy] if proxy else [],
+            'proxy_probe_target': proxy or '',
+        },
+    )
+
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_peak_rss(stop))
+    started_at = time.monotonic()
+    try:
+        results = await runner.run(
+            make_accounts(level, level * accounts_per_worker))
+    finally:
+        stop.set()
+    elapsed = time.monotonic() - started_at
+    peak_rss = await sampler
+
+    durations, errors = load_step_durations(trace_path)
+    context_rss = [
+        result['peak_rss'] for result in results if result.get('peak_rss')
+    ]
+    return {
+        'level': level,
+        'accounts': len(results),
+        'succeeded': sum(1 for result in results if result['is_success']),
+        'elapsed': elapsed,
+        'accounts_per_minute': len(results) / elapsed * 60 if elapsed else 0,
+        'peak_rss_mb': peak_rss / 1024 / 1024,
+        'launch_profile': launch_profile,
+        'context_rss_mb': (
+            sum(context_rss) / len(context_rss) / 1024 / 1024
+            if context_rss else 0
+        ),
+        'steps': {
+            name: {
+                'count': len(values),
+                'errors': errors[name],
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+            }
+            for name, values in sorted(durations.items())
+        },
+    }
+
+
+def print_level(result: Dict[str, Any]) -> None:
+    print(
+        f'\n== {result["level"]} concurrent accounts: '
+        f'{result["succeeded"]}/{result["accounts"]} succeeded in '
+        f'{result["elapsed"]:.1f} s, '
+        f'{result["accounts_per_minute"]:.1f} accounts/min, '
+        f'peak PSS {result["peak_rss_mb"]:.0f} MB, '
+        f'{result["context_rss_mb"]:.0f} MB per context '
+        f'({result["launch_profile"]} launch profile)'
+    )
+    print(f'{"step":<28}{"count":>8}{"errors":>8}{"p50":>10}{"p95":>10}')
+    for name, step in result['steps'].items():
+        print(
+            f'{name:<28}{step["count"]:>8}{step["errors"]:>8}'
+            f'{step["p50"]:>10.3f}{step["p95"]:>10.3f}'
+        )
+
+
+async def main(
+    levels: List[int],
+    accounts_per_worker: int,
+    headless: bool,
+    output: Optional[str],
+    proxy_latency: Optional[float],
+    launch_profile: str,
+) -> None:
+    results = []
+    fake_proxy = None
+    proxy = None
+    if proxy_latency is not None:
+        fake_proxy = FakeProxy(proxy_latency)
+        host, port = await fake_proxy.start()
+        proxy = f'{host}:{port}'
+
+    try:
+        with tempfile.TemporaryDirectory(prefix='rabby-bench-') as work_dir:
+            async with async_playwright() as pw:
+                for level in levels:
+                    result = await run_level(
+                        pw, level, accounts_per_worker, headless, work_dir,
+                        proxy, launch_profile)
+                    print_level(result)
+                    results.append(result)
+    finally:
+        if fake_proxy:
+            await fake_proxy.close()
+
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+def cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Run the Rabby/Openion flow against local stand-in pages')
+    parser.add_argument(
+        '--levels', type=int, nargs='+', default=list(LEVELS))
+    parser.add_argument('--accounts-per-worker', type=int, default=2)
+    parser.add_argument('--headful', action='store_true')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument(
+        '--launch-profile', choices=('default', 'lean'), default='default')
+    parser.add_argument(
+        '--proxy-latency',
+        type=float,
+        help='Route browsers through a local stand-in proxy with this latency',
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+    asyncio.run(main(
+        args.levels,
+        args.accounts_per_worker,
+        not args.headful,
+        args.output,
+        args.proxy_latency,
+        args.launch_profile,
+    ))
+
+
+if __name__ == '__main__':
+    cli()
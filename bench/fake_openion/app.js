@@ -0,0 +1,24 @@
+// Mirrors the DOM paths in OpenionXPath for the landing and login screens.
+const RENDER_DELAY = 50;
+const mainContent = document.getElementById('main-content');
+
+document.getElementById('explore').addEventListener('click', () => setTimeout(() => {
+    mainContent.innerHTML = `
+        <div><div><div>
+            <div>Markets</div>
+            <div><div><div><div>
+                <div>Trending</div>
+                <div>New</div>
+                <div><div><button id="login">Log in</button></div></div>
+            </div></div></div></div>
+        </div></div></div>`;
+
+    document.getElementById('login').addEventListener('click', () => setTimeout(() => {
+        const modal = document.createElement('div');
+        modal.innerHTML = '<div><div id="rabby">Rabby Wallet</div><div>MetaMask</div></div>';
+        document.body.appendChild(modal);
+        document.getElementById('rabby').addEventListener('click', () => {
+            window.postMessage({type: 'bench-rabby-connect'}, '*');
+        });
+    }, RENDER_DELAY));
+}, RENDER_DELAY));
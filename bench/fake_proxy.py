@@ -0,0 +1,98 @@
+# Usage from the repository root: python -m bench.fake_proxy --port 8899 --latency 0.2
+import argparse
+import asyncio
+from typing import Optional, Tuple
+
+
+class FakeProxy:
+    def __init__(
+        self,
+        latency: float = 0,
+        is_broken: bool = False,
+    ) -> None:
+        self.latency = latency
+        self.is_broken = is_broken
+        self.connections = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+    ) -> Tuple[str, int]:
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self.connections += 1
+        try:
+            request_line = (await reader.readline()).decode()
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            await asyncio.sleep(self.latency)
+
+            method, target = request_line.split()[:2]
+            if self.is_broken or method != 'CONNECT':
+                writer.write(b'HTTP/1.1 502 Bad Gateway\r\n\r\n')
+                return
+
+            host, _, port = target.rpartition(':')
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection(
+                    host, int(port))
+            except OSError:
+                writer.write(b'HTTP/1.1 502 Bad Gateway\r\n\r\n')
+                return
+
+            writer.write(b'HTTP/1.1 200 Connection Established\r\n\r\n')
+            await asyncio.gather(
+                self._pipe(reader, upstream_writer),
+                self._pipe(upstream_reader, writer),
+            )
+        except (OSError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _pipe(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            while data := await reader.read(64 * 1024):
+                writer.write(data)
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def main(
+    port: int,
+    latency: float,
+    is_broken: bool,
+) -> None:
+    proxy = FakeProxy(latency, is_broken)
+    host, port = await proxy.start(port=port)
+    print(f'Stand-in proxy listening on http://{host}:{port}')
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run a local HTTP CONNECT proxy stand-in')
+    parser.add_argument('--port', type=int, default=8899)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--broken', action='store_true')
+    args = parser.parse_args()
+
+    asyncio.run(main(args.port, args.latency, args.broken))
@@ -0,0 +1,44 @@
+// Opens the same notification pages Rabby opens when a dapp asks to connect
+// and when the connection has to be signed.
+chrome.runtime.onMessage.addListener((message) => {
+    if (message.type === 'connect') {
+        chrome.tabs.create({url: 'notification.html'});
+    } else if (message.type === 'sign') {
+        setTimeout(() => chrome.tabs.create({url: 'notification.html#/approval'}), 1000);
+    }
+});
+
+// The wallet controller behind Rabby's popup port, enough for the direct
+// import path of RabbyWalletWithPlaywright.
+const controller = {
+    isBooted: async () => Boolean((await chrome.storage.local.get('vault')).vault),
+    boot: (password) => chrome.storage.local.set({vault: password}),
+    unlock: async (password) => {
+        if ((await chrome.storage.local.get('vault')).vault !== password) {
+            throw new Error('Incorrect password');
+        }
+    },
+    importPrivateKey: async (privateKey) => {
+        await chrome.storage.local.set({privateKey});
+        return [{type: 'Simple Key Pair', address: '0x0000000000000000000000000000000000000000'}];
+    },
+};
+
+chrome.runtime.onConnect.addListener((port) => {
+    if (port.name !== 'popup') return;
+
+    port.onMessage.addListener(async (message) => {
+        if (message?._type_ !== 'ETH_WALLET_request') return;
+        const {ident, data} = message.data;
+        let res, err;
+        try {
+            if (data?.type !== 'controller' || !controller[data.method]) {
+                throw new Error(`Unknown controller method ${data?.method}`);
+            }
+            res = await controller[data.method](...(data.params || []));
+        } catch (e) {
+            err = {message: e.message};
+        }
+        port.postMessage({_type_: 'ETH_WALLET_response', data: {ident, res, err}});
+    });
+});
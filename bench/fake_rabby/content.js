@@ -0,0 +1,5 @@
+window.addEventListener('message', (event) => {
+    if (event.source === window && event.data && event.data.type === 'bench-rabby-connect') {
+        chrome.runtime.sendMessage({type: 'connect'});
+    }
+});
@@ -0,0 +1,74 @@
+// Mirrors the DOM paths in RabbyXPath for every onboarding screen.
+const RENDER_DELAY = 50;
+const root = document.getElementById('root');
+
+const screens = {
+    '#/new-user/guide': `
+        <div><div>
+            <div>Rabby Wallet</div>
+            <div>
+                <button>Create new address</button>
+                <button data-go="#/new-user/import/select">I already have an address</button>
+            </div>
+        </div></div>`,
+    '#/new-user/import/select': `
+        <div><div>
+            <div>Import an address</div>
+            <div>
+                <div>Seed phrase</div>
+                <div data-go="#/new-user/import/private-key">Private key</div>
+            </div>
+        </div></div>`,
+    '#/new-user/import/private-key': `
+        <div><div><div>
+            <input id="privateKey" type="password">
+            <button data-action="private-key">Confirm</button>
+        </div></div></div>`,
+    '#/new-user/import/set-password': `
+        <div><div><div><form>
+            <input id="password" type="password">
+            <input id="confirmPassword" type="password">
+            <footer><button type="button" data-action="password">Confirm</button></footer>
+        </form></div></div></div>`,
+    '#/new-user/success': `
+        <div><div>
+            <div>Imported successfully</div>
+            <button data-go="#/dashboard">Done</button>
+        </div></div>`,
+    '#/unlock': `
+        <div><div><input id="password" type="password"></div></div>`,
+    '#/dashboard': `<div><div>Dashboard</div></div>`,
+};
+
+const render = () => setTimeout(() => {
+    root.innerHTML = screens[location.hash] || screens['#/new-user/guide'];
+}, RENDER_DELAY);
+
+root.addEventListener('click', (event) => {
+    const target = event.target.closest('[data-go], [data-action]');
+    if (!target) return;
+
+    if (target.dataset.go) {
+        location.hash = target.dataset.go;
+    } else if (target.dataset.action === 'private-key') {
+        if (document.getElementById('privateKey').value) {
+            location.hash = '#/new-user/import/set-password';
+        }
+    } else if (target.dataset.action === 'password') {
+        const password = document.getElementById('password').value;
+        if (password && password === document.getElementById('confirmPassword').value) {
+            chrome.storage.local.set({vault: password}, () => {
+                location.hash = '#/new-user/success';
+            });
+        }
+    }
+});
+
+root.addEventListener('keydown', (event) => {
+    if (location.hash === '#/unlock' && event.key === 'Enter') {
+        location.hash = '#/dashboard';
+    }
+});
+
+window.addEventListener('hashchange', render);
+render();
@@ -0,0 +1,27 @@
+// Mirrors the connect and signature popups addressed by OpenionXPath.
+const root = document.getElementById('root');
+
+if (location.hash === '#/approval') {
+    root.innerHTML = `
+        <div><footer><div><section>
+            <div>Sign text</div>
+            <div><div><button id="confirm">Confirm</button></div></div>
+        </section></div></footer></div>`;
+    document.getElementById('confirm').addEventListener('click', () => {
+        setTimeout(() => window.close(), 500);
+    });
+} else {
+    root.innerHTML = `
+        <div><div><div><div>
+            <div>Connect to Dapp</div>
+            <div>openion.com</div>
+            <div><div><div>
+                <div><span>Rabby</span><span id="approval">Ignore all</span></div>
+                <button id="sign">Connect</button>
+                <button>Cancel</button>
+            </div></div></div>
+        </div></div></div></div>`;
+    document.getElementById('sign').addEventListener('click', () => {
+        chrome.runtime.sendMessage({type: 'sign'});
+    });
+}
@@ -0,0 +1,154 @@
+import asyncio
+import csv
+import json
+import os
+import re
+from itertools import islice
+from logging import Logger
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, TextIO, Tuple
+
+from src.managers.playwright.proxy_pool import parse_proxy
+from src.managers.rabby_wallet_pw.types import ParsedWithUserData
+
+
+ACCOUNT_FIELDS = (
+    'mnemonic',
+    'private_key',
+    'password',
+    'proxy_type',
+    'proxy',
+    'address',
+    'public_key',
+)
+# Never copied into the reject file, a row rejected for its proxy may still
+# hold a valid key
+SECRET_FIELDS = ('mnemonic', 'private_key', 'password', 'proxy')
+PRIVATE_KEY_PATTERN = re.compile(r'^(0x)?[0-9a-fA-F]{64}$')
+MNEMONIC_LENGTHS = (12, 15, 18, 21, 24)
+
+
+def read_rows(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    extension = os.path.splitext(path)[1].lower()
+
+    with open(path, newline='', encoding='utf-8-sig') as accounts_file:
+        if extension == '.csv':
+            # Line numbers count the header, like an editor would
+            for line, row in enumerate(csv.DictReader(accounts_file), start=2):
+                yield line, row
+        elif extension == '.jsonl':
+            for line, raw in enumerate(accounts_file, start=1):
+                if not raw.strip():
+                    continue
+                try:
+                    row = json.loads(raw)
+                except ValueError as e:
+                    yield line, {'__error__': f'Invalid JSON: {e}'}
+                    continue
+                yield line, row if isinstance(row, dict) else {
+                    '__error__': 'Row is not a JSON object'}
+        else:
+            raise Exception(
+                f'Unsupported accounts file {path}, expected .csv or .jsonl')
+
+
+def parse_account(
+    line: int,
+    row: Dict[str, Any],
+) -> ParsedWithUserData:
+    if error := row.get('__error__'):
+        raise Exception(error)
+
+    values = {
+        field: str(value).strip()
+        for field in ACCOUNT_FIELDS
+        if (value := row.get(field)) is not None and str(value).strip()
+    }
+
+    if not values.get('password'):
+        raise Exception('Password is required')
+    if not values.get('mnemonic') and not values.get('private_key'):
+        raise Exception('Either mnemonic or private_key is required')
+    if (
+        (private_key := values.get('private_key'))
+        and not PRIVATE_KEY_PATTERN.match(private_key)
+    ):
+        raise Exception('private_key must be 64 hex characters')
+    if (
+        (mnemonic := values.get('mnemonic'))
+        and len(mnemonic.split()) not in MNEMONIC_LENGTHS
+    ):
+        raise Exception(
+            f'mnemonic must have one of {MNEMONIC_LENGTHS} words')
+    if proxy := values.get('proxy'):
+        # The parse error quotes the proxy with its credentials
+        try:
+            parse_proxy(proxy, values.get('proxy_type'))
+        except Exception:
+            raise Exception('proxy is not a valid proxy address')
+
+    serial_number = str(row.get('serial_number') or line).strip()
+    account: ParsedWithUserData = {
+        **values,
+        'serial_number': serial_number,
+        'user_id': str(row.get('user_id') or serial_number).strip(),
+    }
+    return account
+
+
+def redact_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        field: '<redacted>' if field in SECRET_FIELDS and value else value
+        for field, value in row.items()
+    }
+
+
+def iter_accounts(
+    path: str,
+    reject_path: Optional[str] = None,
+    logger: Optional[Logger] = None,
+) -> Iterator[ParsedWithUserData]:
+    reject_file: Optional[TextIO] = None
+    rejected = 0
+
+    try:
+        for line, row in read_rows(path):
+            try:
+                yield parse_account(line, row)
+            except Exception as e:
+                rejected += 1
+                if logger:
+                    logger.warning('Rejected account on line %s: %s', line, e)
+                if reject_path:
+                    if reject_file is None:
+                        reject_file = open(reject_path, 'a')
+                    reject_file.write(json.dumps({
+                        'line': line,
+                        'error': str(e),
+                        'row': redact_row(row),
+                    }) + '\n')
+    finally:
+        if reject_file:
+            reject_file.close()
+        if logger and rejected:
+            logger.warning(
+                'Rejected %s accounts from %s%s', rejected, path,
+                f', see {reject_path}' if reject_path else '')
+
+
+async def aiter_accounts(
+    path: str,
+    reject_path: Optional[str] = None,
+    logger: Optional[Logger] = None,
+    chunk_size: int = 100,
+) -> AsyncIterator[ParsedWithUserData]:
+    # Rows are read and validated off the event loop a chunk at a time, so
+    # the first accounts start while the rest of the file is still unread
+    accounts = iter_accounts(path, reject_path, logger)
+    try:
+        while chunk := await asyncio.to_thread(
+            lambda: list(islice(accounts, chunk_size))
+        ):
+            for account in chunk:
+                yield account
+    finally:
+        accounts.close()
@@ -0,0 +1,359 @@
+# Usage from the repository root: python -m src.cli run --accounts accounts.csv
+# Heavy dependencies are imported inside the commands that need them, shard
+# processes import this module again on spawn.
+import argparse
+import builtins
+import importlib.util
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXTENSION_PATH = os.path.join(REPOSITORY_DIR, 'Rabby_v0.93.12')
+REFERRAL_URL = 'https://openion.com/i/2mMykkBndKR'
+
+
+class ImportProfiler:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        # Module name, cumulative and self seconds of every first import
+        self.records: List[Tuple[str, float, float]] = []
+        self._children: List[float] = []
+        self._import = builtins.__import__
+
+    def start(self) -> None:
+        builtins.__import__ = self._timed_import
+
+    def stop(self) -> None:
+        builtins.__import__ = self._import
+
+    def report(self, top: int = 15) -> None:
+        self.stop()
+        total = time.perf_counter() - self.started
+        by_package: Dict[str, float] = defaultdict(float)
+        for name, _, own in self.records:
+            by_package[name.split('.')[0]] += own
+
+        print(
+            f'Startup took {total * 1000:.0f} ms, '
+            f'{sum(by_package.values()) * 1000:.0f} ms of it importing',
+            file=sys.stderr,
+        )
+        print(f'{"package":<32}{"self ms":>10}', file=sys.stderr)
+        for package, own in sorted(
+            by_package.items(), key=lambda item: -item[1]
+        )[:top]:
+            print(f'{package:<32}{own * 1000:>10.1f}', file=sys.stderr)
+
+        print(f'\n{"module":<48}{"cumulative ms":>15}', file=sys.stderr)
+        for name, cumulative, _ in sorted(
+            self.records, key=lambda record: -record[1]
+        )[:top]:
+            print(f'{name:<48}{cumulative * 1000:>15.1f}', file=sys.stderr)
+
+    def _timed_import(
+        self,
+        name: str,
+        globals: Optional[Dict[str, Any]] = None,
+        locals: Optional[Dict[str, Any]] = None,
+        fromlist: Tuple[str, ...] = (),
+        level: int = 0,
+    ) -> Any:
+        module_name = name
+        if level:
+            try:
+                module_name = importlib.util.resolve_name(
+                    '.' * level + name, (globals or {}).get('__package__'))
+            except (ImportError, ValueError):
+                pass
+        if module_name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+
+        self._children.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            self.records.append((module_name, elapsed, elapsed - children))
+
+
+_profiler: Optional[ImportProfiler] = None
+
+
+def startup_done() -> None:
+    global _profiler
+    if _profiler:
+        _profiler.report()
+        _profiler = None
+
+
+def get_setting(
+    value: Any,
+    env_name: str,
+    default: Any = None,
+    cast: Callable[[str], Any] = str,
+) -> Any:
+    if value is not None:
+        return value
+    if (env_value := os.getenv(env_name)) not in (None, ''):
+        return cast(env_value)
+    return default
+
+
+def get_runner_config(args: argparse.Namespace) -> Dict[str, Any]:
+    # Flags win over the environment (and .env), which wins over defaults
+    min_workers = get_setting(args.min_workers, 'MIN_WORKERS', 0, int)
+    proxies = get_setting(args.proxies, 'PROXIES', '')
+
+    return {
+        'extension_path': get_setting(
+            args.extension_path, 'EXTENSION_PATH', EXTENSION_PATH),
+        'referral_url': get_setting(
+            args.referral_url, 'REFERRAL_URL', REFERRAL_URL),
+        'workers': get_setting(args.workers, 'WORKERS', 1, int),
+        # Admission control stays off unless a minimum is set
+        'admission': {
+            'min_concurrency': min_workers,
+            'rss_budget_mb': get_setting(
+                args.rss_budget_mb, 'RSS_BUDGET_MB', 0, int),
+        } if min_workers else {},
+        'launch_profile': get_setting(
+            args.launch_profile, 'LAUNCH_PROFILE', 'default'),
+        'measure_memory': (
+            args.measure_memory or os.getenv('MEASURE_MEMORY', '') == '1'),
+        # 0 turns the per-account watchdog off
+        'account_timeout': get_setting(
+            args.account_timeout, 'ACCOUNT_TIMEOUT', 300, float),
+        'account_retries': get_setting(
+            args.account_retries, 'ACCOUNT_RETRIES', 1, int),
+        'use_rabby_controller': not (
+            args.ui_import or os.getenv('UI_IMPORT', '') == '1'),
+        'profile_template_dir': get_setting(
+            args.profile_template_dir, 'PROFILE_TEMPLATE_DIR', ''),
+        'profile_store_dir': get_setting(
+            args.profile_store_dir, 'PROFILE_STORE_DIR', ''),
+        'asset_cache_dir': get_setting(
+            args.asset_cache_dir, 'ASSET_CACHE_DIR', ''),
+        # Unset means on only next to the asset cache
+        'block_resources': get_setting(
+            args.block_resources, 'BLOCK_RESOURCES', None,
+            lambda value: value == '1'),
+        'proxies': [
+            proxy.strip() for proxy in proxies.split(',') if proxy.strip()
+        ],
+        'proxy_type': get_setting(args.proxy_type, 'PROXY_TYPE', 'http'),
+        'fingerprint_cache_path': get_setting(
+            args.fingerprints, 'FINGERPRINT_CACHE_PATH', ''),
+        'trace_path': get_setting(args.trace, 'TRACE_PATH', ''),
+        'journal_path': get_setting(
+            args.journal, 'JOURNAL_PATH', 'journal.sqlite3'),
+        'result_path': get_setting(args.results, 'RESULT_PATH', 'results.csv'),
+    }
+
+
+def get_env_accounts() -> List[Dict[str, str]]:
+    private_keys = os.getenv('PRIVATE_KEYS') or os.getenv('PRIVATE_KEY', '')
+    return [
+        {
+            'serial_number': str(serial_number),
+            'user_id': str(serial_number),
+            'private_key': private_key.strip(),
+            'password': os.getenv('PASSWORD', ''),
+        }
+        for serial_number, private_key in enumerate(
+            filter(None, map(str.strip, private_keys.split(','))), start=1)
+    ]
+
+
+def run(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from dotenv import load_dotenv
+
+    from src.logging_setup import setup_logging
+
+    load_dotenv()
+    config = get_runner_config(args)
+    logger = setup_logging(
+        'main',
+        drop_chatter=(
+            args.drop_chatter or os.getenv('DROP_CHATTER', '') == '1'),
+    )
+    config['logger'] = logger
+
+    if args.command == 'resume' and not os.path.exists(config['journal_path']):
+        logger.error(f'No journal to resume from at {config["journal_path"]}')
+        sys.exit(1)
+
+    accounts_path = get_setting(args.accounts, 'ACCOUNTS_FILE', '')
+    reject_path = get_setting(
+        args.rejects, 'REJECT_FILE', 'rejected_accounts.jsonl')
+    shards = get_setting(args.shards, 'SHARDS', 1, int)
+
+    from src.account_loader import aiter_accounts, iter_accounts
+
+    if shards > 1:
+        from src.runner import ShardedRunner
+
+        async def run_accounts() -> List[Any]:
+            runner = ShardedRunner(config, shards=shards)
+            return await runner.run(
+                iter_accounts(accounts_path, reject_path, logger)
+                if accounts_path else get_env_accounts()
+            )
+    else:
+        from patchright.async_api import async_playwright
+
+        from src.runner import AccountRunner
+
+        async def run_accounts() -> List[Any]:
+            async with async_playwright() as pw:
+                runner = AccountRunner(playwright=pw, config=config)
+                return await runner.run(
+                    aiter_accounts(accounts_path, reject_path, logger)
+                    if accounts_path else get_env_accounts()
+                )
+
+    startup_done()
+    for result in asyncio.run(run_accounts()):
+        print(result.get('ref_code') or result.get('error'))
+
+
+def bench(args: argparse.Namespace) -> None:
+    from bench.benchmark import cli
+
+    startup_done()
+    cli(args.bench_args)
+
+
+def build_profile(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from dotenv import load_dotenv
+    from patchright.async_api import async_playwright
+
+    from src.logging_setup import setup_logging
+    from src.managers.playwright.profile_template import TEMPLATE_READY_MARKER
+    from src.runner import AccountRunner
+
+    load_dotenv()
+    config = get_runner_config(args)
+    logger = config['logger'] = setup_logging('main')
+    if not config['profile_template_dir']:
+        config['profile_template_dir'] = 'profile_template'
+
+    marker = os.path.join(config['profile_template_dir'], TEMPLATE_READY_MARKER)
+    if args.force and os.path.exists(marker):
+        os.remove(marker)
+
+    async def build() -> None:
+        async with async_playwright() as pw:
+            runner = AccountRunner(playwright=pw, config=config)
+            await runner.build_profile_template()
+
+    startup_done()
+    asyncio.run(build())
+    logger.info(
+        f'Profile template is ready in {config["profile_template_dir"]}')
+
+
+def add_runner_arguments(parser: argparse.ArgumentParser) -> None:
+    # Unset flags fall back to the environment variable of the same name
+    parser.add_argument('--extension-path')
+    parser.add_argument('--referral-url')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--min-workers', type=int)
+    parser.add_argument('--rss-budget-mb', type=int)
+    parser.add_argument('--launch-profile', choices=('default', 'lean'))
+    parser.add_argument('--measure-memory', action='store_true')
+    parser.add_argument(
+        '--account-timeout', type=float, help='Seconds per account, 0 is off')
+    parser.add_argument(
+        '--account-retries', type=int, help='Retries of timed out accounts')
+    parser.add_argument(
+        '--ui-import',
+        action='store_true',
+        help='Import wallets through the Rabby UI only',
+    )
+    parser.add_argument('--profile-template-dir')
+    parser.add_argument('--profile-store-dir')
+    parser.add_argument('--asset-cache-dir')
+    parser.add_argument(
+        '--block-resources',
+        action=argparse.BooleanOptionalAction,
+        help='Block images, fonts and trackers on Openion pages',
+    )
+    parser.add_argument('--proxies', help='Comma-separated shared proxies')
+    parser.add_argument('--proxy-type')
+    parser.add_argument(
+        '--fingerprints', help='Per-account fingerprint cache path')
+    parser.add_argument('--trace', help='JSONL trace path')
+    parser.add_argument('--journal', help='SQLite checkpoint journal path')
+    parser.add_argument('--results', help='.csv, .jsonl or .sqlite path')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Import Rabby wallets and collect Openion ref codes')
+    parser.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help='Print an import time breakdown once the command is ready',
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for command, description in (
+        ('run', 'Process accounts'),
+        ('resume', 'Process accounts, skipping the journal\'s completed ones'),
+    ):
+        run_parser = subparsers.add_parser(command, help=description)
+        add_runner_arguments(run_parser)
+        run_parser.add_argument('--accounts', help='.csv or .jsonl file')
+        run_parser.add_argument('--rejects', help='Reject file for bad rows')
+        run_parser.add_argument('--shards', type=int)
+        run_parser.add_argument('--drop-chatter', action='store_true')
+        run_parser.set_defaults(handler=run)
+
+    # Everything after `bench` belongs to the benchmark's own parser
+    bench_parser = subparsers.add_parser(
+        'bench',
+        help='Run the offline benchmark, arguments are passed on',
+        add_help=False,
+    )
+    bench_parser.set_defaults(handler=bench)
+
+    profile_parser = subparsers.add_parser(
+        'profile-build', help='Build the shared profile template')
+    add_runner_arguments(profile_parser)
+    profile_parser.add_argument('--force', action='store_true')
+    profile_parser.set_defaults(handler=build_profile)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    global _profiler
+    argv = sys.argv[1:] if argv is None else argv
+    # Started before parsing so nothing the command imports is missed
+    if '--profile-startup' in argv:
+        _profiler = ImportProfiler()
+        _profiler.start()
+
+    parser = build_parser()
+    args, extra_args = parser.parse_known_args(argv)
+    if args.command == 'bench':
+        args.bench_args = extra_args
+    elif extra_args:
+        parser.error(f'unrecognized arguments: {" ".join(extra_args)}')
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+# Monotonic time by which the current account job has to be done, tasks
+# started inside the job inherit it
+current_deadline: ContextVar[Optional[float]] = ContextVar(
+    'current_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def get_remaining() -> Optional[float]:
+    if (deadline := current_deadline.get()) is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def cap_timeout(timeout: float) -> float:
+    # Seconds, cut down to whatever is left of the account's budget. Zero
+    # would mean "no timeout" to Playwright, so a spent budget raises instead.
+    if (remaining := get_remaining()) is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded('Account deadline exceeded')
+    return min(timeout, remaining)
+
+
+def is_deadline_exceeded(error: BaseException) -> bool:
+    # Callers usually log and re-raise their own exception, the original
+    # one stays reachable through the cause or the context
+    while error is not None:
+        if isinstance(error, DeadlineExceeded):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[float]:
+    deadline_at = time.monotonic() + seconds
+    token = current_deadline.set(deadline_at)
+    try:
+        yield deadline_at
+    finally:
+        current_deadline.reset(token)
@@ -0,0 +1,74 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from src.tracing import current_account
+
+
+# Passed as `extra` to per-attempt and sleep messages, which can be dropped
+# as a whole when throughput matters
+CHATTER = {'is_chatter': True}
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(account)s] %(message)s'
+
+
+class AccountContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'account'):
+            record.account = current_account.get() or '-'
+        return True
+
+
+class ChatterFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not getattr(record, 'is_chatter', False)
+
+
+class LocalQueueHandler(QueueHandler):
+    # The queue never leaves the process, so the record is handed over as is
+    # and formatted by the listener thread
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(
+    name: str = 'main',
+    console_level: int = logging.INFO,
+    file_path: Optional[str] = 'rabby.log',
+    file_level: int = logging.DEBUG,
+    drop_chatter: bool = False,
+) -> logging.Logger:
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setLevel(console_level)
+    console_handler.setFormatter(formatter)
+    handlers.append(console_handler)
+
+    if file_path:
+        file_handler = logging.FileHandler(file_path)
+        file_handler.setLevel(file_level)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue: 'queue.SimpleQueue[logging.LogRecord]' = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    # Account context is only known on the event loop thread
+    queue_handler.addFilter(AccountContextFilter())
+    if drop_chatter:
+        queue_handler.addFilter(ChatterFilter())
+
+    logger = logging.getLogger(name)
+    logger.handlers = [queue_handler]
+    logger.setLevel(min(console_level, file_level) if file_path else console_level)
+    logger.propagate = False
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Drains whatever is still queued before the process exits
+    atexit.register(listener.stop)
+    return logger
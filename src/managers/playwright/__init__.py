@@ -1 +1,12 @@
-from .base import PlaywrightManager
\ No newline at end of file
+from .base import PlaywrightManager
+from .context_pool import ContextPool
+from .retry import RetryPolicy
+from .profile_template import ProfileTemplate
+from .profile_store import ProfileStore
+from .flow import FlowExecutor
+from .routing import RequestRouter
+from .asset_cache import AssetCache
+from .page_registry import PageRegistry
+from .proxy_pool import ProxyPool
+from .fingerprints import FingerprintPool
+from .motion import MotionEngine
@@ -0,0 +1,322 @@
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+from email.utils import parsedate_to_datetime
+from logging import Logger
+from typing import Dict, List, Optional, Tuple
+
+from patchright.async_api import APIResponse, Request, Route
+
+from .types import CachedAsset
+from src.utils import write_atomic
+
+
+CACHED_RESOURCE_TYPES = ('script', 'stylesheet', 'font')
+# The cache stores decoded bodies, so transfer headers of the origin
+# response no longer describe them
+DROPPED_HEADERS = {
+    'content-encoding',
+    'content-length',
+    'transfer-encoding',
+    'connection',
+    'set-cookie',
+}
+MAX_AGE_PATTERN = re.compile(r'(?:^|,)\s*(?:s-maxage|max-age)\s*=\s*(\d+)')
+# The index is saved after this many new entries, a crash loses at most
+# these and their blobs are swept on the next load
+SAVE_EVERY = 10
+# Blobs no index points to are only swept once they are this old, another
+# process may have just written one it hasn't indexed yet
+ORPHAN_GRACE = 600
+
+
+class AssetCache:
+    def __init__(
+        self,
+        cache_dir: str,
+        logger: Logger,
+        max_bytes: int = 512 * 1024 * 1024,
+        resource_types: Tuple[str, ...] = CACHED_RESOURCE_TYPES,
+        index_name: str = 'index.json',
+    ) -> None:
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.blobs_dir = os.path.join(self.cache_dir, 'blobs')
+        # Every process sharing the directory keeps an index of its own and
+        # loads the union of all of them
+        self.index_path = os.path.join(self.cache_dir, index_name)
+        self.logger = logger
+        self.max_bytes = max_bytes
+        self.resource_types = resource_types
+
+        self.entries: OrderedDict[str, CachedAsset] = OrderedDict()
+        self.blob_refs: Counter[str] = Counter()
+        self.blob_sizes: Dict[str, int] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.served_bytes = 0
+        self._unsaved = 0
+
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self._load_index()
+        self._sweep_blobs()
+
+    async def handle(
+        self,
+        route: Route,
+        request: Request,
+    ) -> None:
+        if (
+            request.method != 'GET'
+            or request.resource_type not in self.resource_types
+        ):
+            await route.fallback()
+            return
+
+        if cached := await self._get(request.url):
+            entry, body = cached
+            self.hits += 1
+            self.served_bytes += entry['size']
+            await route.fulfill(
+                status=entry['status'],
+                headers=entry['headers'],
+                body=body,
+            )
+            return
+
+        self.misses += 1
+        try:
+            response = await route.fetch()
+        except Exception as e:
+            # Nothing was consumed yet, the browser can still try on its own
+            self.logger.debug('Asset fetch failed for %s: %s', request.url, e)
+            await route.fallback()
+            return
+
+        try:
+            body = await response.body()
+        except Exception as e:
+            self.logger.debug('Asset body failed for %s: %s', request.url, e)
+            await route.abort('failed')
+            return
+        headers = self._clean_headers(response.headers)
+
+        if expires_at := self._get_expiry(response):
+            try:
+                await self._put(
+                    request.url, response.status, headers, body, expires_at)
+            except OSError as e:
+                self.logger.warning(f'Error while caching {request.url}: {e}')
+
+        await route.fulfill(status=response.status, headers=headers, body=body)
+
+    def report(self) -> None:
+        self.logger.info(
+            f'Asset cache: {self.hits} hits, {self.misses} misses, '
+            f'{self.served_bytes / 1_000_000:.1f} MB served locally, '
+            f'{self.total_bytes / 1_000_000:.1f} MB on disk'
+        )
+
+    def save_index(self) -> None:
+        write_atomic(self.index_path, json.dumps(list(self.entries.items())))
+        self._unsaved = 0
+
+    async def _get(
+        self,
+        url: str,
+    ) -> Optional[Tuple[CachedAsset, bytes]]:
+        if not (entry := self.entries.get(url)):
+            return None
+
+        if entry['expires_at'] < time.time():
+            self._evict(url)
+            return None
+
+        try:
+            body = await asyncio.to_thread(self._read_blob, entry['hash'])
+        except OSError:
+            self._evict(url)
+            return None
+
+        self.entries.move_to_end(url)
+        return entry, body
+
+    async def _put(
+        self,
+        url: str,
+        status: int,
+        headers: Dict[str, str],
+        body: bytes,
+        expires_at: float,
+    ) -> None:
+        if len(body) > self.max_bytes:
+            return
+
+        if url in self.entries:
+            self._evict(url)
+
+        digest = hashlib.sha256(body).hexdigest()
+        if digest not in self.blob_sizes:
+            await asyncio.to_thread(self._write_blob, digest, body)
+
+        self.entries[url] = {
+            'hash': digest,
+            'size': len(body),
+            'status': status,
+            'headers': headers,
+            'expires_at': expires_at,
+        }
+        self._add_ref(digest, len(body))
+
+        while self.total_bytes > self.max_bytes and self.entries:
+            self._evict(next(iter(self.entries)))
+
+        self._unsaved += 1
+        if self._unsaved >= SAVE_EVERY:
+            self._unsaved = 0
+            # Serialized here, the entries keep changing while it's written
+            await asyncio.to_thread(
+                write_atomic,
+                self.index_path,
+                json.dumps(list(self.entries.items())),
+            )
+
+    def _evict(self, url: str) -> None:
+        # A concurrent miss for the same URL may have evicted it already
+        if not (entry := self.entries.pop(url, None)):
+            return
+        digest = entry['hash']
+        self.blob_refs[digest] -= 1
+
+        if self.blob_refs[digest] <= 0:
+            del self.blob_refs[digest]
+            self.total_bytes -= self.blob_sizes.pop(digest, 0)
+            try:
+                os.remove(self._get_blob_path(digest))
+            except OSError:
+                pass
+
+    def _get_expiry(
+        self,
+        response: APIResponse,
+    ) -> Optional[float]:
+        if response.status != 200:
+            return None
+
+        headers = response.headers
+        vary = headers.get('vary', '').lower()
+        if vary and vary not in ('accept-encoding', 'origin'):
+            return None
+
+        cache_control = headers.get('cache-control', '').lower()
+        if any(
+            directive in cache_control
+            for directive in ('no-store', 'no-cache', 'private')
+        ):
+            return None
+
+        if max_age := MAX_AGE_PATTERN.search(cache_control):
+            seconds = int(max_age.group(1))
+            return time.time() + seconds if seconds else None
+
+        if expires := headers.get('expires'):
+            try:
+                expires_at = parsedate_to_datetime(expires).timestamp()
+            except (TypeError, ValueError):
+                return None
+            return expires_at if expires_at > time.time() else None
+
+        return None
+
+    def _clean_headers(
+        self,
+        headers: Dict[str, str],
+    ) -> Dict[str, str]:
+        return {
+            name: value for name, value in headers.items()
+            if name.lower() not in DROPPED_HEADERS
+        }
+
+    def _load_index(self) -> None:
+        now = time.time()
+        merged: Dict[str, CachedAsset] = {}
+        for index_path in sorted(
+            glob.glob(os.path.join(self.cache_dir, 'index*.json'))
+        ):
+            try:
+                with open(index_path) as index_file:
+                    entries: List[Tuple[str, CachedAsset]] = json.load(
+                        index_file)
+            except (OSError, ValueError) as e:
+                self.logger.warning(
+                    f'Error while loading asset cache index {index_path}: {e}')
+                continue
+
+            for url, entry in entries:
+                if (
+                    entry['expires_at'] < now
+                    or not os.path.exists(self._get_blob_path(entry['hash']))
+                ):
+                    continue
+                # Two processes may have cached the same URL, the fresher
+                # copy wins
+                if (
+                    (current := merged.get(url))
+                    and current['expires_at'] >= entry['expires_at']
+                ):
+                    continue
+                merged[url] = entry
+
+        for url, entry in merged.items():
+            self.entries[url] = entry
+            self._add_ref(entry['hash'], entry['size'])
+        # Every process fills the directory up to the budget during a run,
+        # the next load brings it back down
+        while self.total_bytes > self.max_bytes and self.entries:
+            self._evict(next(iter(self.entries)))
+
+    def _sweep_blobs(self) -> None:
+        # Blobs of a run that died before saving its index, and temporary
+        # files of writes it never finished, are not counted anywhere else
+        swept_at = time.time()
+        for root, _, names in os.walk(self.blobs_dir):
+            for name in names:
+                if name in self.blob_sizes:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    if swept_at - os.path.getmtime(path) > ORPHAN_GRACE:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _add_ref(
+        self,
+        digest: str,
+        size: int,
+    ) -> None:
+        self.blob_refs[digest] += 1
+        if digest not in self.blob_sizes:
+            self.blob_sizes[digest] = size
+            self.total_bytes += size
+
+    def _read_blob(self, digest: str) -> bytes:
+        with open(self._get_blob_path(digest), 'rb') as blob:
+            return blob.read()
+
+    def _write_blob(
+        self,
+        digest: str,
+        body: bytes,
+    ) -> None:
+        blob_path = self._get_blob_path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        write_atomic(blob_path, body)
+
+    def _get_blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], digest)
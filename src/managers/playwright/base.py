@@ -1,15 +1,23 @@
-import asyncio
-import random
 from logging import Logger
-from typing import List, Literal, Optional
+from typing import List, Literal, Optional, Union
 
 from patchright.async_api import (
     BrowserContext,
     ElementHandle,
     Page,
-    expect
 )
 
+from .asset_cache import AssetCache
+from .motion import MotionEngine
+from .page_registry import PageRegistry
+from .retry import (
+    CLICK_BY_CORDS_RETRY_POLICY,
+    CLICK_RETRY_POLICY,
+    GET_ELEMENT_RETRY_POLICY,
+    INPUT_RETRY_POLICY,
+    RetryPolicy,
+)
+from .routing import RequestRouter
 from .types import (
     ClickByCordsProps,
     ClickProps,
@@ -17,7 +25,12 @@ from .types import (
     GetElementProps,
     TypeInInputOptions
 )
-from src.utils import sleep, sleep_by_range
+from src.deadline import cap_timeout
+from src.tracing import traced
+from src.utils import sleep
+
+
+DEFAULT_MOTION_ENGINE = MotionEngine()
 
 
 class PlaywrightManager:
@@ -25,10 +38,33 @@ class PlaywrightManager:
         self,
         browser_context: BrowserContext,
         logger: Logger,
+        retry_policy: Optional[RetryPolicy] = None,
+        motion: Optional[MotionEngine] = None,
     ) -> None:
         self.browser_context = browser_context
         self.logger = logger
+        self.retry_policy = retry_policy
+        self.motion = motion or DEFAULT_MOTION_ENGINE
+        self.page_registry = PageRegistry.for_context(browser_context, logger)
+
+    @traced()
+    async def enable_asset_cache(
+        self,
+        asset_cache: AssetCache,
+    ) -> None:
+        self.logger.info('Enabling shared asset cache...')
+        await self.browser_context.route('**/*', asset_cache.handle)
+
+    @traced()
+    async def enable_routing(
+        self,
+        router: RequestRouter,
+    ) -> None:
+        self.logger.info('Enabling request routing...')
+        await self.browser_context.route(
+            router.get_url_matcher(), router.handle)
 
+    @traced()
     async def get_all_pages(self) -> List[Page]:
         try:
             self.logger.info('Getting all pages...')
@@ -43,47 +79,63 @@ class PlaywrightManager:
             return pages
         except Exception as e:
             self.logger.error(
-                f'Error while retrieving pages from browser: {e}')
+                'Error while retrieving pages from browser: %s', e)
             return []
     
+    @traced()
     async def open_extension_popup(
         self,
         url: str,
         timeout: int = 15
     ) -> Page:
-        extension_page = None
-        
-        for page in self.browser_context.pages:
-            if url == page.url:
-                extension_page = page
-                break
-            
-        if not extension_page:
-            try:
-                extension_page = await self.browser_context.wait_for_event(
-                    'page',
-                    timeout=timeout * 1000,
-                )
-            except TimeoutError:
-                err_msg = f'Error: extension page hasn\'t opened in {timeout} seconds'
-                self.logger.error(err_msg)
-                raise Exception(err_msg)
+        timeout = cap_timeout(timeout)
+        try:
+            extension_page = await self.page_registry.wait_for_page(
+                url,
+                'url',
+                timeout=timeout,
+            )
+        except Exception:
+            err_msg = f'Error: extension page hasn\'t opened in {timeout} seconds'
+            self.logger.error(err_msg)
+            raise Exception(err_msg)
 
         await extension_page.bring_to_front()
         return extension_page
 
+    @traced()
+    async def wait_for_extension(
+        self,
+        timeout: int = 15,
+    ) -> bool:
+        if self.browser_context.service_workers or self.browser_context.background_pages:
+            return True
+
+        timeout = cap_timeout(timeout)
+        try:
+            await self.browser_context.wait_for_event(
+                'serviceworker',
+                timeout=timeout * 1000,
+            )
+            return True
+        except Exception:
+            self.logger.warning(
+                'Extension hasn\'t booted in %s seconds', timeout)
+            return False
+
+    @traced()
     async def open_page(
         self,
         url: Optional[str] = None,
         timeout: int = 10,
     ) -> Page:
         try:
-            self.logger.info(f'Opening new browser page with url: {url}...')
+            self.logger.info('Opening new browser page with url: %s...', url)
 
             page = await self.browser_context.new_page()
 
             if url:
-                await page.goto(url, timeout=timeout * 1000)
+                await page.goto(url, timeout=cap_timeout(timeout) * 1000)
 
             return page
         except Exception as e:
@@ -91,193 +143,140 @@ class PlaywrightManager:
             self.logger.error(err_msg)
             raise Exception(err_msg)
 
+    @traced()
     async def click(
         self,
         props: ClickProps,
     ) -> None:
         page = props['page']
         locator = props['locator']
-        max_attempts = props.get('max_attempts', 5)
         wait_before_action = props.get('wait_before_action', 0)
-        delay_between_attempts = props.get('delay_between_attempts', 1)
-        delay_to_wait_element = props.get('delay_to_wait_element', 10)
         is_required = props.get('is_required', True)
         show_attempt_log = props.get('show_attempt_log', False)
         click_count = props.get('click_count', 1)
+        retry_policy = self._get_retry_policy(props, CLICK_RETRY_POLICY)
 
-        self.logger.info(f'Clicking on an element with locator: {locator}')
-        await sleep(wait_before_action, self.logger)
-
-        is_success_click = False
-        attempts = 0
-
-        while attempts < max_attempts: # type: ignore
-            try:
-                timeout = delay_to_wait_element * 1000 # type: ignore
-                await page.locator(locator).click(
-                    timeout=timeout,
-                    click_count=click_count
-                )
-                is_success_click = True
-                break
-            except Exception as e:
-                if show_attempt_log:
-                    self.logger.warning(
-                        f'Attempt {attempts + 1} of {max_attempts}')
-            finally:
-                attempts += 1
-                await sleep(delay_between_attempts, self.logger) # type: ignore
-
-        if not is_success_click and is_required:
-            err_msg = f'No element was clicked with locator: {locator}'
-            self.logger.error(err_msg)
-            raise Exception(err_msg)
+        self.logger.info('Clicking on an element with locator: %s', locator)
+        if wait_before_action:
+            await sleep(cap_timeout(wait_before_action), self.logger)
 
+        try:
+            await retry_policy.run(
+                lambda timeout: page.locator(locator).click(
+                    timeout=timeout * 1000,
+                    click_count=click_count,
+                ),
+                self.logger,
+                show_attempt_log,
+            )
+        except Exception as e:
+            if is_required:
+                err_msg = f'No element was clicked with locator: {locator}. {e}'
+                self.logger.error(err_msg)
+                raise Exception(err_msg)
+
+    @traced()
     async def click_by_cords(
         self,
         props: ClickByCordsProps,
     ) -> None:
         page = props['page']
         locator = props['locator']
-        max_attempts = props.get('max_attempts', 5)
-        delay_between_attempts = props.get('delay_between_attempts', 1)
         is_required = props.get('is_required', True)
-        delay_to_wait_element = props.get('delay_to_wait_element', 30)
         show_attempt_log = props.get('show_attempt_log', False)
         click_count = props.get('click_count', 1)
         offset_x = props.get('offset_x', 0)
         offset_y = props.get('offset_y', 0)
+        retry_policy = self._get_retry_policy(
+            props, CLICK_BY_CORDS_RETRY_POLICY)
+
+        self.logger.info('Clicking on an element with locator: %s', locator)
+
+        async def click_once(timeout: float) -> None:
+            timeout_ms = timeout * 1000
+            element_locator = page.locator(locator)
+            # A single visibility wait, the mouse lands on the element anyway
+            # so hovering it first would only wait for it a second time
+            await element_locator.wait_for(state='visible', timeout=timeout_ms)
+            box = await element_locator.bounding_box(timeout=timeout_ms)
+            if not box:
+                raise Exception(f'Element with locator {locator} has no box')
+
+            await self.motion.click(
+                page,
+                box['x'] + box['width'] / (offset_x or 2),
+                box['y'] + box['height'] / (offset_y or 2),
+                target_size=min(box['width'], box['height']),
+                click_count=click_count,
+            )
 
-        self.logger.info(f'Clicking on an element with locator: {locator}')
-
-        is_success_click = False
-        attempts = 0
-
-        while attempts < max_attempts: # type: ignore
-            try:
-                timeout = delay_to_wait_element * 1000 # type: ignore
-                element_locator = page.locator(locator)
-                await expect(element_locator).to_be_visible(timeout=timeout)
-                box = (
-                    await element_locator.bounding_box()  # type: ignore
-                    or {'x': 0, 'y': 0, 'width': 0, 'height': 0}
-                )
-
-                center_x = box['x'] + box['width'] / (offset_x or 2)
-                center_y = box['y'] + box['height'] / (offset_y or 2)
-
-                if box:
-                    await page.mouse.move(center_x, center_y)
-
-                await sleep_by_range((0.1, 0.5))
-
-                await page.hover(locator, timeout=timeout)
-                await page.mouse.click(
-                    center_x,
-                    center_y,
-                    click_count=click_count,
-                    delay=300
-                )
-
-                is_success_click = True
-                break
-            except Exception as e:
-                if show_attempt_log:
-                    self.logger.warning(
-                        f'Attempt {attempts + 1} of {max_attempts}')
-            finally:
-                attempts += 1
-                await sleep(delay_between_attempts, self.logger)
-
-        if not is_success_click and is_required:
-            err_msg = f'No element was clicked with locator: {locator}'
-            self.logger.error(err_msg)
-            raise Exception(err_msg)
+        try:
+            await retry_policy.run(click_once, self.logger, show_attempt_log)
+        except Exception as e:
+            if is_required:
+                err_msg = f'No element was clicked with locator: {locator}. {e}'
+                self.logger.error(err_msg)
+                raise Exception(err_msg)
 
+    @traced()
     async def get_element(
         self,
         props: GetElementProps,
     ) -> Optional[ElementHandle]:
         page = props['page']
         locator = props['locator']
-        max_attempts = props.get('max_attempts', 3)
-        delay_between_attempts = props.get(
-            'delay_between_attempts', 0.3)
         is_required = props.get('is_required', True)
-        delay_to_wait_element = props.get(
-            'delay_to_wait_element', 3)
         show_attempt_log = props.get(
             'show_attempt_log', False)
+        retry_policy = self._get_retry_policy(props, GET_ELEMENT_RETRY_POLICY)
 
-        self.logger.info(f'Searching element with locator: {locator}')
-
-        attempts = 0
-        element: Optional[ElementHandle] = None
-
-        while attempts < max_attempts and element is None:
-            try:
-                if (
-                    element := await page.wait_for_selector(
-                        locator,
-                        timeout=delay_to_wait_element * 1000
-                    )
-                ):
-                    return element
-
-                if show_attempt_log:
-                    self.logger.warning(
-                        f'Attempt {attempts + 1} of {max_attempts}')
-            except Exception as err:
-                if show_attempt_log:
-                    self.logger.warning(
-                        f'Attempt {attempts + 1} of {max_attempts}')
-            finally:
-                attempts += 1
-                await sleep(delay_between_attempts)
-
-        if element is None and is_required:
-            err_message = f'No element was found by locator: {locator}'
-            self.logger.error(err_message)
-            raise Exception(err_message)
+        self.logger.info('Searching element with locator: %s', locator)
 
-        return element
+        try:
+            return await retry_policy.run(
+                lambda timeout: self._wait_for_element(page, locator, timeout),
+                self.logger,
+                show_attempt_log,
+            )
+        except Exception:
+            if is_required:
+                err_message = f'No element was found by locator: {locator}'
+                self.logger.error(err_message)
+                raise Exception(err_message)
 
+        return None
+
+    @traced()
     async def get_element_with_retry(
         self,
         page: Page,
         locator: str,
-        max_attempts: int = 3,
-        delay: tuple = (0.3, 0.5)  # Using a tuple to represent the range
+        max_attempts: Optional[int] = None,
+        delay: Optional[tuple] = None,  # Using a tuple to represent the range
+        retry_policy: Optional[RetryPolicy] = None,
     ) -> ElementHandle:
-        self.logger.info(f'Searching element with locator: {locator}')
-
-        attempts = 0
-        element: Optional[ElementHandle] = None
-
-        while attempts < max_attempts and element is None:
-            try:
-                if (element := await page.wait_for_selector(
-                    locator,
-                    timeout=random.randint(1300, 2100)
-                )):
-                    return element
-
-                self.logger.warning(
-                    f'Attempt {attempts + 1} of {max_attempts}')
-            except Exception as err:
-                self.logger.warning(
-                    f'Attempt {attempts + 1} of {max_attempts}')
-            finally:
-                attempts += 1
-                await sleep(random.uniform(*delay))
+        self.logger.info('Searching element with locator: %s', locator)
 
-        if element is None:
+        # Only what the caller passed overrides the policy
+        retry_policy = (
+            retry_policy or self.retry_policy or INPUT_RETRY_POLICY
+        ).override(
+            max_attempts=max_attempts,
+            delay=min(delay) if delay else None,
+        )
+
+        try:
+            return await retry_policy.run(
+                lambda timeout: self._wait_for_element(page, locator, timeout),
+                self.logger,
+                show_attempt_log=True,
+            )
+        except Exception:
             err_message = f'No element was found by locator: {locator}'
             self.logger.error(err_message)
             raise Exception(err_message)
 
-        return element
-
+    @traced()
     async def get_element_attribute(
         self,
         props: GetElementAttributeProps,
@@ -288,13 +287,15 @@ class PlaywrightManager:
 
         try:
             self.logger.info(
-                f'Searching {attribute} attribute of element with locator: {locator}')
+                'Searching %s attribute of element with locator: %s',
+                attribute, locator)
             return await page.get_attribute(selector=locator, name=attribute)
         except Exception as e:
             err_msg = f'Error while getting element attribute: {e}'
             self.logger.error(err_msg)
             raise Exception(err_msg)
 
+    @traced()
     async def close_page(
         self,
         page: Page,
@@ -311,6 +312,7 @@ class PlaywrightManager:
             self.logger.error(err_msg)
             raise Exception(err_msg)
 
+    @traced()
     async def close_unused_pages(
         self,
         pages: List[Page],
@@ -324,20 +326,16 @@ class PlaywrightManager:
             self.logger.error(err_msg)
             raise Exception(err_msg)
 
+    @traced()
     async def find_page_by_value(
         self,
         value: str,
         type: Literal['url', 'title']
     ) -> Page:
         try:
-            self.logger.info(f'Looking for page by value: {value}')
+            self.logger.info('Looking for page by value: %s', value)
 
-            pages = await self.get_all_pages()
-            page_promises = [
-                self._get_page_value(page, value, type) for page in pages
-            ]
-            matched_pages = await asyncio.gather(*page_promises)
-            filtered_pages = [page for page in matched_pages if page]
+            filtered_pages = await self.page_registry.find(value, type)
 
             if not filtered_pages:
                 err_message = '0 pages were found'
@@ -346,7 +344,7 @@ class PlaywrightManager:
 
             if len(filtered_pages) > 1:
                 self.logger.info('Closing extra pages...')
-                await self.close_unused_pages(filtered_pages)
+                await self.close_unused_pages(filtered_pages[1:])
 
             return filtered_pages[0]
         except Exception as err:
@@ -354,20 +352,28 @@ class PlaywrightManager:
             self.logger.error(err_message)
             raise Exception(err_message)
 
+    @traced()
     async def clear_input(
         self,
         page: Page,
         locator: str,
+        retry_policy: Optional[RetryPolicy] = None,
     ) -> None:
+        retry_policy = retry_policy or self.retry_policy or INPUT_RETRY_POLICY
+
+        async def clear_once(timeout: float) -> None:
+            element = await self._wait_for_element(page, locator, timeout)
+            await element.fill('', timeout=timeout * 1000)
+
         try:
-            element = await self.get_element_with_retry(page, locator)
-            self.logger.info(f'Clearing input with locator: {locator}')
-            await element.fill('')
+            self.logger.info('Clearing input with locator: %s', locator)
+            await retry_policy.run(clear_once, self.logger)
         except Exception as err:
             err_message = f'Error while clearing input: {err}'
             self.logger.error(err_message)
             raise Exception(err_message)
 
+    @traced()
     async def type_in_input(
         self,
         props: TypeInInputOptions,
@@ -377,26 +383,43 @@ class PlaywrightManager:
         text = props['text']
         is_required = props.get('is_required', True)
         wait_time = props.get('wait_time', 3)
+        retry_policy = (
+            props.get('retry_policy') or self.retry_policy or INPUT_RETRY_POLICY
+        ).override(deadline=props.get('deadline'))
+
+        async def type_once(timeout: float) -> None:
+            element = await self._wait_for_element(page, locator, timeout)
+            await element.fill(text, timeout=cap_timeout(wait_time) * 1000)
 
         try:
-            element = await self.get_element_with_retry(page, locator)
-            self.logger.info(f'Typing in input with locator: {locator}')
-            await element.fill(text, timeout=wait_time * 1000)
+            self.logger.info('Typing in input with locator: %s', locator)
+            await retry_policy.run(type_once, self.logger)
         except Exception as err:
             if is_required:
                 err_message = f'Error while typing in input: {err}'
                 self.logger.error(err_message)
                 raise Exception(err_message)
 
-    async def _get_page_value(
+    def _get_retry_policy(
+        self,
+        props: Union[ClickProps, GetElementProps],
+        default: RetryPolicy,
+    ) -> RetryPolicy:
+        retry_policy = props.get('retry_policy') or self.retry_policy or default
+        return retry_policy.override(
+            max_attempts=props.get('max_attempts'),
+            delay=props.get('delay_between_attempts'),
+            attempt_timeout=props.get('delay_to_wait_element'),
+            deadline=props.get('deadline'),
+        )
+
+    async def _wait_for_element(
         self,
         page: Page,
-        value: str,
-        type: Literal['url', 'title']
-    ) -> Optional[Page]:
-        if type == 'title':
-            result = await page.title()
-        elif type == 'url':
-            result = page.url
-
-        return page if value in result else None
+        locator: str,
+        timeout: float,
+    ) -> ElementHandle:
+        element = await page.wait_for_selector(locator, timeout=timeout * 1000)
+        if element is None:
+            raise Exception(f'Element with locator {locator} is not attached')
+        return element
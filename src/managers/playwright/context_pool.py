@@ -0,0 +1,230 @@
+import asyncio
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from logging import Logger
+from typing import AsyncIterator, Awaitable, Callable, Optional, Set
+
+from patchright.async_api import BrowserContext
+
+from .base import PlaywrightManager
+from .profile_template import ProfileTemplate
+from .types import ContextPoolConfig
+
+
+ContextLauncher = Callable[[str], Awaitable[BrowserContext]]
+ContextResetHook = Callable[[BrowserContext], Awaitable[None]]
+ProfileHook = Callable[[str], None]
+
+
+class PooledContext:
+    def __init__(
+        self,
+        browser_context: BrowserContext,
+        user_data_dir: str,
+        is_dedicated: bool = False,
+    ) -> None:
+        self.browser_context = browser_context
+        self.user_data_dir = user_data_dir
+        self.is_dedicated = is_dedicated
+        self.uses = 0
+
+
+class ContextPool:
+    def __init__(
+        self,
+        launcher: ContextLauncher,
+        logger: Logger,
+        config: ContextPoolConfig,
+        reset_hook: Optional[ContextResetHook] = None,
+        profile_template: Optional[ProfileTemplate] = None,
+    ) -> None:
+        self.launcher = launcher
+        self.logger = logger
+        self.size = max(1, config['size'])
+        self.max_uses = max(1, config.get('max_uses', 20))
+        self.reset_mode = config.get('reset_mode', 'reset')
+        self.user_data_root = config.get('user_data_root')
+        self.extension_boot_timeout = config.get('extension_boot_timeout', 15)
+        self.close_timeout = config.get('close_timeout', 10)
+        self.reset_hook = reset_hook
+        self.profile_template = profile_template
+
+        # Holds warm contexts. `None` is a placeholder for a slot whose
+        # background launch failed, the next `acquire()` launches it inline.
+        self._idle: asyncio.Queue[Optional[PooledContext]] = asyncio.Queue()
+        self._warming: Set[asyncio.Task] = set()
+        # Pooled contexts in circulation: idle, in use or warming
+        self._slots = 0
+        self._is_closed = False
+
+    async def start(self) -> None:
+        self.logger.info(f'Warming up {self.size} browser contexts...')
+        for _ in range(self.size):
+            self._slots += 1
+            self._warm_in_background()
+        await asyncio.gather(*self._warming, return_exceptions=True)
+
+    async def resize(self, size: int) -> None:
+        self.size = max(1, size)
+
+        while self._slots < self.size:
+            self._slots += 1
+            self._warm_in_background()
+
+        # Contexts in use are dropped when they are released
+        while self._slots > self.size and not self._idle.empty():
+            self._slots -= 1
+            if pooled := self._idle.get_nowait():
+                await self._retire(pooled)
+
+    @asynccontextmanager
+    async def acquire(
+        self,
+        restore: Optional[ProfileHook] = None,
+        persist: Optional[ProfileHook] = None,
+        launcher: Optional[ContextLauncher] = None,
+    ) -> AsyncIterator[BrowserContext]:
+        # A profile that has to be restored must be on disk before Chromium
+        # starts and launch options such as a proxy are fixed for the whole
+        # browser, so such jobs get a dedicated cold context instead of a warm one
+        if restore or launcher:
+            pooled = await self._launch(restore, launcher)
+            pooled.is_dedicated = True
+        elif (pooled := await self._idle.get()) is None:
+            try:
+                pooled = await self._launch()
+            except Exception:
+                self._idle.put_nowait(None)
+                raise
+
+        is_healthy = False
+        try:
+            yield pooled.browser_context
+            is_healthy = True
+        finally:
+            pooled.uses += 1
+            await self._release(pooled, is_healthy, persist)
+
+    async def close(self) -> None:
+        self._is_closed = True
+
+        for task in list(self._warming):
+            task.cancel()
+        await asyncio.gather(*self._warming, return_exceptions=True)
+
+        while not self._idle.empty():
+            if pooled := self._idle.get_nowait():
+                await self._retire(pooled)
+
+    async def _release(
+        self,
+        pooled: PooledContext,
+        is_healthy: bool,
+        persist: Optional[ProfileHook] = None,
+    ) -> None:
+        if self._is_closed or pooled.is_dedicated:
+            await self._retire(pooled, persist if is_healthy else None)
+            return
+
+        if self._slots > self.size:
+            self._slots -= 1
+            await self._retire(pooled, persist if is_healthy else None)
+            return
+
+        if (
+            is_healthy
+            and not persist
+            and self.reset_mode == 'reset'
+            and pooled.uses < self.max_uses
+        ):
+            try:
+                await self._reset(pooled.browser_context)
+                self._idle.put_nowait(pooled)
+                return
+            except Exception as e:
+                self.logger.warning(f'Error while resetting context: {e}')
+
+        await self._retire(pooled, persist if is_healthy else None)
+        self._warm_in_background()
+
+    async def _reset(
+        self,
+        browser_context: BrowserContext,
+    ) -> None:
+        pages = browser_context.pages
+        for page in pages[1:]:
+            await page.close()
+        if pages:
+            await pages[0].goto('about:blank')
+
+        await browser_context.clear_cookies()
+
+        if self.reset_hook:
+            await self.reset_hook(browser_context)
+
+    async def _launch(
+        self,
+        restore: Optional[ProfileHook] = None,
+        launcher: Optional[ContextLauncher] = None,
+    ) -> PooledContext:
+        user_data_dir = tempfile.mkdtemp(
+            prefix='pooled-context-',
+            dir=self.user_data_root,
+        )
+
+        try:
+            if self.profile_template:
+                await asyncio.to_thread(
+                    self.profile_template.clone, user_data_dir)
+            if restore:
+                await asyncio.to_thread(restore, user_data_dir)
+            browser_context = await (launcher or self.launcher)(user_data_dir)
+        except BaseException:
+            shutil.rmtree(user_data_dir, ignore_errors=True)
+            raise
+
+        await PlaywrightManager(browser_context, self.logger).wait_for_extension(
+            self.extension_boot_timeout,
+        )
+        return PooledContext(browser_context, user_data_dir)
+
+    async def _retire(
+        self,
+        pooled: PooledContext,
+        persist: Optional[ProfileHook] = None,
+    ) -> None:
+        # A hung browser must not keep the slot, it is killed by then anyway
+        try:
+            await asyncio.wait_for(
+                pooled.browser_context.close(), self.close_timeout)
+        except Exception as e:
+            self.logger.warning(f'Error while closing pooled context: {e!r}')
+
+        # Chromium flushes cookies and LevelDB only on close
+        if persist:
+            try:
+                await asyncio.to_thread(persist, pooled.user_data_dir)
+            except Exception as e:
+                self.logger.error(f'Error while persisting profile: {e}')
+
+        shutil.rmtree(pooled.user_data_dir, ignore_errors=True)
+
+    def _warm_in_background(self) -> None:
+        task = asyncio.create_task(self._warm())
+        self._warming.add(task)
+        task.add_done_callback(self._warming.discard)
+
+    async def _warm(self) -> None:
+        try:
+            pooled = await self._launch()
+        except Exception as e:
+            self.logger.error(f'Error while warming browser context: {e}')
+            self._idle.put_nowait(None)
+            return
+
+        if self._is_closed:
+            await self._retire(pooled)
+            return
+
+        self._idle.put_nowait(pooled)
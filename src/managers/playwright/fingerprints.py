@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+from logging import Logger
+from typing import Any, Dict, List, Optional, Tuple
+
+from .types import Fingerprint
+from src.utils import write_atomic
+
+
+FINGERPRINT_CACHE_VERSION = 3
+# Older user agents are not reduced to a major version yet
+MIN_CHROME_VERSION = 120
+CHROME_VERSION_PATTERN = re.compile(r'Chrome/\d+')
+PLATFORM_TOKENS = {
+    'Windows': 'Windows NT 10.0; Win64; x64',
+    'Mac OS X': 'Macintosh; Intel Mac OS X 10_15_7',
+    'Linux': 'X11; Linux x86_64',
+}
+# Common desktop window sizes per platform, so a Mac never reports a
+# typical Windows laptop screen
+VIEWPORTS = {
+    'Windows': ((1366, 768), (1536, 864), (1920, 1080), (1440, 900)),
+    'Mac OS X': ((1440, 900), (1512, 982), (1680, 1050), (1280, 800)),
+    'Linux': ((1366, 768), (1920, 1080), (1600, 900)),
+}
+# Only the user agent is overridden, navigator.platform, userAgentData and
+# the Sec-CH-UA-Platform header keep reporting the OS Chromium runs on
+HOST_PLATFORM = (
+    'Windows' if sys.platform == 'win32'
+    else 'Mac OS X' if sys.platform == 'darwin'
+    else 'Linux'
+)
+# Locale and timezone are picked as a pair, they have to agree
+LOCALES = (
+    ('en-US', 'America/New_York'),
+    ('en-US', 'America/Chicago'),
+    ('en-US', 'America/Los_Angeles'),
+    ('en-GB', 'Europe/London'),
+    ('de-DE', 'Europe/Berlin'),
+    ('fr-FR', 'Europe/Paris'),
+    ('es-ES', 'Europe/Madrid'),
+    ('it-IT', 'Europe/Rome'),
+    ('nl-NL', 'Europe/Amsterdam'),
+    ('pl-PL', 'Europe/Warsaw'),
+)
+
+
+def get_chrome_major(executable_path: str) -> Optional[int]:
+    # navigator.userAgentData and the Sec-CH-UA headers always report the
+    # real version, the user agent string has to agree with them
+    try:
+        output = subprocess.run(
+            [executable_path, '--version'],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    match = re.search(r'(\d+)\.\d+\.\d+\.\d+', output)
+    return int(match.group(1)) if match else None
+
+
+def load_user_agents(chrome_major: int) -> List[Tuple[str, str]]:
+    # Only read while building the pool, never at context launch. The major
+    # version is always the real one, minor and build digits come from
+    # the dataset.
+    try:
+        from fake_useragent import UserAgent
+
+        user_agents = {
+            (
+                CHROME_VERSION_PATTERN.sub(
+                    f'Chrome/{chrome_major}', entry['useragent'].strip('"')),
+                entry['os'],
+            )
+            for entry in UserAgent().data_browsers
+            if entry.get('browser') == 'Chrome'
+            and entry.get('type') == 'desktop'
+            and entry.get('os') == HOST_PLATFORM
+            and entry.get('browser_version_major_minor', 0) >= MIN_CHROME_VERSION
+        }
+        if user_agents:
+            return sorted(user_agents)
+    except Exception:
+        pass
+
+    # Fallback when fake_useragent is not installed or changed its data
+    # format, the reduced user agent Chrome itself sends
+    return [(
+        f'Mozilla/5.0 ({PLATFORM_TOKENS[HOST_PLATFORM]}) '
+        f'AppleWebKit/537.36 (KHTML, like Gecko) '
+        f'Chrome/{chrome_major}.0.0.0 Safari/537.36',
+        HOST_PLATFORM,
+    )]
+
+
+class FingerprintPool:
+    def __init__(
+        self,
+        cache_path: str,
+        logger: Logger,
+        size: int = 512,
+        seed: int = 0,
+    ) -> None:
+        self.cache_path = cache_path
+        self.logger = logger
+        self.size = max(1, size)
+        self.seed = seed
+        self.fingerprints: List[Fingerprint] = []
+        self.chrome_major: Optional[int] = None
+
+    def load(self, executable_path: str) -> None:
+        if (chrome_major := get_chrome_major(executable_path)) is None:
+            self.logger.warning(
+                f'Chromium version of {executable_path} is unknown, '
+                'fingerprints keep its own user agent'
+            )
+        self.chrome_major = chrome_major
+
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path) as cache_file:
+                    cache = json.load(cache_file)
+                if (
+                    cache.get('version') == FINGERPRINT_CACHE_VERSION
+                    and cache.get('platform') == HOST_PLATFORM
+                    and cache.get('chrome_major') == chrome_major
+                ):
+                    self.fingerprints = self._unpack(cache)
+                    self.logger.info(
+                        f'Loaded {len(self.fingerprints)} fingerprints '
+                        f'from {self.cache_path}'
+                    )
+                    return
+            except (
+                OSError, ValueError, KeyError, TypeError, AttributeError,
+            ) as e:
+                self.logger.warning(
+                    f'Fingerprint cache {self.cache_path} is unreadable, '
+                    f'rebuilding it: {e}'
+                )
+
+        self.logger.info(f'Building fingerprint pool in {self.cache_path}...')
+        cache = self._build()
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        write_atomic(self.cache_path, json.dumps(cache, separators=(',', ':')))
+        self.fingerprints = self._unpack(cache)
+
+    def get(self, serial_number: str) -> Optional[Fingerprint]:
+        if not self.fingerprints:
+            return None
+        # A stable hash, unlike hash(), gives the account the same
+        # fingerprint in every run for as long as the cache file is kept
+        digest = hashlib.sha1(serial_number.encode()).digest()
+        index = int.from_bytes(digest[:8], 'big') % len(self.fingerprints)
+        return self.fingerprints[index]
+
+    def _build(self) -> Dict[str, Any]:
+        rng = random.Random(self.seed)
+        user_agents = (
+            load_user_agents(self.chrome_major)
+            if self.chrome_major is not None else [(None, HOST_PLATFORM)]
+        )
+        viewports = sorted({
+            viewport for sizes in VIEWPORTS.values() for viewport in sizes})
+
+        # Fingerprints are stored as index triples into the shared tables
+        rows = []
+        for _ in range(self.size):
+            user_agent_index = rng.randrange(len(user_agents))
+            platform = user_agents[user_agent_index][1]
+            viewport = rng.choice(VIEWPORTS[platform])
+            rows.append([
+                user_agent_index,
+                viewports.index(viewport),
+                rng.randrange(len(LOCALES)),
+            ])
+
+        return {
+            'version': FINGERPRINT_CACHE_VERSION,
+            'platform': HOST_PLATFORM,
+            'chrome_major': self.chrome_major,
+            'user_agents': [user_agent for user_agent, _ in user_agents],
+            'viewports': [list(viewport) for viewport in viewports],
+            'locales': [list(locale) for locale in LOCALES],
+            'fingerprints': rows,
+        }
+
+    def _unpack(self, cache: Dict[str, Any]) -> List[Fingerprint]:
+        fingerprints: List[Fingerprint] = []
+        for user_agent_index, viewport_index, locale_index in cache['fingerprints']:
+            width, height = cache['viewports'][viewport_index]
+            locale, timezone_id = cache['locales'][locale_index]
+            fingerprint: Fingerprint = {
+                'viewport': {'width': width, 'height': height},
+                'locale': locale,
+                'timezone_id': timezone_id,
+            }
+            if user_agent := cache['user_agents'][user_agent_index]:
+                fingerprint['user_agent'] = user_agent
+            fingerprints.append(fingerprint)
+        return fingerprints
@@ -0,0 +1,257 @@
+import math
+import uuid
+from typing import Dict, List, Optional
+
+from patchright.async_api import Page, expect
+
+from .base import PlaywrightManager
+from .types import FlowStep
+from src.deadline import cap_timeout
+from src.tracing import traced
+
+
+BATCHABLE_ACTIONS = ('click', 'fill', 'expect_url')
+DEFAULT_STEP_TIMEOUT = 10
+
+# Runs a segment of click/fill/expect_url steps in one evaluate call. The
+# number of finished steps is mirrored to sessionStorage, so it can still be
+# read back when a click navigates and destroys the execution context. The
+# counter is written before the first step, a missing one means the progress
+# is unknown rather than zero.
+BATCH_SCRIPT = '''
+async ([steps, progressKey]) => {
+    const find = (xpath) => document.evaluate(
+        xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null,
+    ).singleNodeValue;
+    const isReady = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && !el.disabled
+            && getComputedStyle(el).visibility !== 'hidden';
+    };
+    const waitFor = async (check, timeout) => {
+        const deadline = Date.now() + timeout;
+        while (Date.now() < deadline) {
+            const result = check();
+            if (result) return result;
+            await new Promise((resolve) => setTimeout(resolve, 50));
+        }
+        return null;
+    };
+
+    sessionStorage.setItem(progressKey, '0');
+    for (let i = 0; i < steps.length; i++) {
+        const step = steps[i];
+
+        if (step.action === 'expect_url') {
+            if (!await waitFor(() => location.href === step.url, step.timeout)) {
+                return {done: i, error: `URL is ${location.href}, expected ${step.url}`};
+            }
+        } else {
+            const el = await waitFor(() => {
+                const node = find(step.locator);
+                return node && isReady(node) ? node : null;
+            }, step.timeout);
+            if (!el) {
+                return {done: i, error: `No element was found by locator: ${step.locator}`};
+            }
+
+            if (step.action === 'click') {
+                for (let count = 0; count < step.click_count; count++) el.click();
+            } else {
+                const proto = el instanceof HTMLTextAreaElement
+                    ? HTMLTextAreaElement.prototype
+                    : HTMLInputElement.prototype;
+                el.focus();
+                Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, step.text);
+                el.dispatchEvent(new Event('input', {bubbles: true}));
+                el.dispatchEvent(new Event('change', {bubbles: true}));
+            }
+        }
+        sessionStorage.setItem(progressKey, String(i + 1));
+    }
+
+    sessionStorage.removeItem(progressKey);
+    return {done: steps.length, error: null};
+}
+'''
+
+
+class FlowExecutor:
+    def __init__(
+        self,
+        pw_manager: PlaywrightManager,
+    ) -> None:
+        self.pw_manager = pw_manager
+        self.logger = pw_manager.logger
+
+    async def run(
+        self,
+        steps: List[FlowStep],
+        page: Optional[Page] = None,
+        variables: Optional[Dict[str, str]] = None,
+    ) -> Optional[Page]:
+        steps = [self._render(step, variables or {}) for step in steps]
+        index = 0
+
+        while index < len(steps):
+            step = steps[index]
+
+            if (
+                not self._is_batchable(step)
+                or not self._is_extension_page(page)
+            ):
+                page = await self._run_step(page, step)
+                index += 1
+                continue
+
+            segment_end = index
+            while (
+                segment_end < len(steps)
+                and self._is_batchable(steps[segment_end])
+            ):
+                segment_end += 1
+
+            segment = steps[index:segment_end]
+            done = await self._run_batch(page, segment)
+
+            # Whatever the batch couldn't finish goes through the regular
+            # PlaywrightManager calls with their retry policies
+            for fallback_step in segment[done:]:
+                page = await self._run_step(page, fallback_step)
+            index = segment_end
+
+        return page
+
+    @traced('flow_batch')
+    async def _run_batch(
+        self,
+        page: Page,
+        segment: List[FlowStep],
+    ) -> int:
+        progress_key = f'__flow_{uuid.uuid4().hex}'
+        self.logger.info('Running %s flow steps in one batch...', len(segment))
+
+        try:
+            result = await page.evaluate(BATCH_SCRIPT, [
+                [
+                    {
+                        'action': step['action'],
+                        'locator': step.get('locator'),
+                        'text': step.get('text'),
+                        'url': step.get('url'),
+                        'timeout': cap_timeout(
+                            step.get('timeout', DEFAULT_STEP_TIMEOUT)) * 1000,
+                        'click_count': step.get('click_count', 1),
+                    }
+                    for step in segment
+                ],
+                progress_key,
+            ])
+        except Exception as e:
+            done = await self._read_progress(page, progress_key)
+            if done is None:
+                # Starting over would replay clicks the batch already made
+                err_msg = (
+                    f'Flow batch was interrupted and its progress is '
+                    f'unknown: {e}'
+                )
+                self.logger.error(err_msg)
+                raise Exception(err_msg)
+
+            self.logger.info(
+                'Flow batch was interrupted after %s steps: %s', done, e)
+            return done
+
+        if result['error']:
+            self.logger.warning(
+                'Flow batch stopped after %s steps: %s',
+                result['done'], result['error'],
+            )
+        return result['done']
+
+    async def _read_progress(
+        self,
+        page: Page,
+        progress_key: str,
+    ) -> Optional[int]:
+        # None when the counter can't be read, e.g. after a cross-origin
+        # navigation that left its sessionStorage behind
+        try:
+            await page.wait_for_load_state('domcontentloaded')
+            progress = await page.evaluate(
+                '''(key) => {
+                    const progress = sessionStorage.getItem(key);
+                    sessionStorage.removeItem(key);
+                    return progress;
+                }''',
+                progress_key,
+            )
+            return int(progress) if progress is not None else None
+        except Exception:
+            return None
+
+    async def _run_step(
+        self,
+        page: Optional[Page],
+        step: FlowStep,
+    ) -> Optional[Page]:
+        action = step['action']
+        timeout = cap_timeout(step.get('timeout', DEFAULT_STEP_TIMEOUT))
+
+        if action == 'open_page':
+            return await self.pw_manager.open_page(
+                url=step.get('url'),
+                timeout=math.ceil(timeout),
+            )
+        if action == 'wait_popup':
+            return await self.pw_manager.open_extension_popup(
+                url=step['url'],
+                timeout=math.ceil(timeout),
+            )
+
+        if page is None:
+            err_msg = f'Step {action} needs an open page'
+            self.logger.error(err_msg)
+            raise Exception(err_msg)
+
+        if action == 'click':
+            await self.pw_manager.click({
+                'page': page,
+                'locator': step['locator'],
+                'click_count': step.get('click_count', 1),
+                'delay_to_wait_element': math.ceil(timeout),
+            })
+        elif action == 'fill':
+            await self.pw_manager.type_in_input({
+                'page': page,
+                'locator': step['locator'],
+                'text': step['text'],
+                'wait_time': timeout,
+            })
+        elif action == 'expect_url':
+            await expect(page).to_have_url(step['url'], timeout=timeout * 1000)
+        elif action == 'close_page':
+            await self.pw_manager.close_page(page)
+            return None
+
+        return page
+
+    def _is_batchable(self, step: FlowStep) -> bool:
+        return step['action'] in BATCHABLE_ACTIONS and not step.get('trusted')
+
+    def _is_extension_page(self, page: Optional[Page]) -> bool:
+        # DOM clicks are untrusted events, a website could tell them apart
+        # from a real user, so batches only run on extension pages
+        return page is not None and page.url.startswith('chrome-extension://')
+
+    def _render(
+        self,
+        step: FlowStep,
+        variables: Dict[str, str],
+    ) -> FlowStep:
+        rendered = step.copy()
+        if 'text' in rendered:
+            rendered['text'] = rendered['text'].format(**variables)
+        if 'url' in rendered:
+            rendered['url'] = rendered['url'].format(**variables)
+        return rendered
@@ -0,0 +1,66 @@
+from typing import Any, Dict
+
+from .types import LaunchProfile
+
+
+DEFAULT_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+]
+
+LAUNCH_PROFILES: Dict[str, LaunchProfile] = {
+    'default': {
+        'headless': False,
+        'args': DEFAULT_ARGS,
+    },
+    # Trades services the flow never touches for memory, so more contexts
+    # fit on one host. Extensions need the new headless mode, which is what
+    # the `chromium` channel runs with `headless=True`.
+    'lean': {
+        'headless': True,
+        'viewport': {'width': 1024, 'height': 640},
+        'args': [
+            *DEFAULT_ARGS,
+            '--disable-background-networking',
+            '--disable-component-update',
+            '--disable-sync',
+            '--disable-default-apps',
+            '--disable-domain-reliability',
+            '--disable-client-side-phishing-detection',
+            '--disable-breakpad',
+            '--disable-features=Translate,OptimizationHints,MediaRouter,'
+            'AutofillServerCommunication,CalculateNativeWinOcclusion,'
+            'InterestFeedContentSuggestions,SpareRendererForSitePerProcess',
+            '--metrics-recording-only',
+            '--no-first-run',
+            '--mute-audio',
+            '--disable-gpu',
+            '--renderer-process-limit=4',
+            '--disk-cache-size=33554432',
+            '--media-cache-size=1048576',
+            '--js-flags=--max-old-space-size=512',
+        ],
+    },
+}
+
+
+def get_launch_options(
+    profile_name: str,
+    extension_path: str,
+) -> Dict[str, Any]:
+    if not (profile := LAUNCH_PROFILES.get(profile_name)):
+        raise Exception(
+            f'Unknown launch profile {profile_name}, '
+            f'expected one of: {", ".join(LAUNCH_PROFILES)}'
+        )
+
+    options: Dict[str, Any] = {
+        'headless': profile['headless'],
+        'args': [
+            f'--disable-extensions-except={extension_path}',
+            f'--load-extension={extension_path}',
+            *profile['args'],
+        ],
+    }
+    if viewport := profile.get('viewport'):
+        options['viewport'] = viewport
+    return options
@@ -0,0 +1,208 @@
+import asyncio
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from patchright.async_api import CDPSession, Page
+
+from src.utils import sleep
+
+
+Point = Tuple[float, float]
+
+# The straight piece up to every waypoint is filled in with `steps` more
+# mouse events
+PATH_SEGMENTS = 6
+STEPS_PER_SEGMENT = 4
+# Fitts's law constants, seconds
+MOVE_BASE_TIME = 0.1
+MOVE_TIME_PER_BIT = 0.12
+CLICK_DELAY_MS = (60, 140)
+DEFAULT_VIEWPORT = {'width': 1280, 'height': 720}
+
+
+def _ease(t: float) -> float:
+    # Slow start and slow landing, fastest in the middle
+    return (1 - math.cos(math.pi * t)) / 2
+
+
+def _bezier(controls: List[Point], t: float) -> Point:
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3) = controls
+    u = 1 - t
+    return (
+        u ** 3 * x0 + 3 * u * u * t * x1 + 3 * u * t * t * x2 + t ** 3 * x3,
+        u ** 3 * y0 + 3 * u * u * t * y1 + 3 * u * t * t * y2 + t ** 3 * y3,
+    )
+
+
+def build_unit_path(
+    rng: random.Random,
+    segments: int = PATH_SEGMENTS,
+) -> List[Point]:
+    # Runs from (0, 0) to (1, 0), the bend and jitter are relative to the
+    # distance and get rotated onto the real start and end later
+    bend = rng.uniform(-0.25, 0.25)
+    controls = [
+        (0.0, 0.0),
+        (rng.uniform(0.2, 0.4), bend + rng.uniform(-0.08, 0.08)),
+        (rng.uniform(0.6, 0.85), bend * rng.uniform(0.2, 1.0)),
+        (1.0, 0.0),
+    ]
+
+    path = []
+    for index in range(1, segments + 1):
+        x, y = _bezier(controls, _ease(index / segments))
+        if index < segments:
+            x += rng.gauss(0, 0.01)
+            y += rng.gauss(0, 0.01)
+        path.append((x, y))
+    return path
+
+
+class MotionEngine:
+    def __init__(
+        self,
+        bank_size: int = 64,
+        segments: int = PATH_SEGMENTS,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.rng = random.Random(seed)
+        # Paths are built once and only scaled and rotated per move
+        self.paths = [
+            build_unit_path(self.rng, segments) for _ in range(bank_size)]
+        self._positions: 'WeakKeyDictionary[Page, Point]' = (
+            WeakKeyDictionary())
+        self._sessions: 'WeakKeyDictionary[Page, Optional[CDPSession]]' = (
+            WeakKeyDictionary())
+
+    def get_path(self, start: Point, end: Point) -> List[Point]:
+        start_x, start_y = start
+        dx, dy = end[0] - start_x, end[1] - start_y
+        return [
+            (start_x + u * dx - v * dy, start_y + u * dy + v * dx)
+            for u, v in self.rng.choice(self.paths)
+        ]
+
+    def get_duration(self, distance: float, target_size: float) -> float:
+        bits = math.log2(distance / max(target_size, 1) + 1)
+        return (
+            (MOVE_BASE_TIME + MOVE_TIME_PER_BIT * bits)
+            * self.rng.uniform(0.8, 1.2)
+        )
+
+    def get_position(self, page: Page) -> Point:
+        if position := self._positions.get(page):
+            return position
+        # Nothing moved the cursor yet, start it somewhere in the viewport
+        viewport = page.viewport_size or DEFAULT_VIEWPORT
+        return (
+            self.rng.uniform(0, viewport['width']),
+            self.rng.uniform(0, viewport['height']),
+        )
+
+    async def move(
+        self,
+        page: Page,
+        x: float,
+        y: float,
+        target_size: float = 1,
+    ) -> None:
+        start = self.get_position(page)
+        path = self.get_path(start, (x, y))
+        pause = self.get_duration(
+            math.hypot(x - start[0], y - start[1]), target_size) / len(path)
+
+        for point_x, point_y in path:
+            await page.mouse.move(point_x, point_y, steps=STEPS_PER_SEGMENT)
+            await sleep(pause)
+        self._positions[page] = (x, y)
+
+    async def click(
+        self,
+        page: Page,
+        x: float,
+        y: float,
+        target_size: float = 1,
+        click_count: int = 1,
+    ) -> None:
+        if not (session := await self._get_session(page)):
+            await self.move(page, x, y, target_size)
+            await page.mouse.click(
+                x,
+                y,
+                click_count=click_count,
+                delay=self.rng.uniform(*CLICK_DELAY_MS),
+            )
+            return
+
+        events = self.get_click_events(
+            self.get_position(page), x, y, target_size, click_count)
+        # Sent back to back, the browser handles a session's messages in
+        # order, so the whole click costs one round trip. The timestamps
+        # spread the events over the time a hand would take.
+        await asyncio.gather(*(
+            session.send('Input.dispatchMouseEvent', event)
+            for event in events
+        ))
+        self._positions[page] = (x, y)
+        # The next click's timestamps must not go back in time
+        await sleep(max(0, events[-1]['timestamp'] - time.time()))
+
+    def get_click_events(
+        self,
+        start: Point,
+        x: float,
+        y: float,
+        target_size: float = 1,
+        click_count: int = 1,
+    ) -> List[Dict[str, Any]]:
+        path = self.get_path(start, (x, y))
+        pause = self.get_duration(
+            math.hypot(x - start[0], y - start[1]), target_size,
+        ) / (len(path) * STEPS_PER_SEGMENT)
+        timestamp = time.time()
+
+        events: List[Dict[str, Any]] = []
+        previous = start
+        for point in path:
+            for step in range(1, STEPS_PER_SEGMENT + 1):
+                ratio = step / STEPS_PER_SEGMENT
+                timestamp += pause
+                events.append({
+                    'type': 'mouseMoved',
+                    'x': previous[0] + (point[0] - previous[0]) * ratio,
+                    'y': previous[1] + (point[1] - previous[1]) * ratio,
+                    'timestamp': timestamp,
+                })
+            previous = point
+
+        for count in range(1, click_count + 1):
+            for event_type, buttons in (
+                ('mousePressed', 1), ('mouseReleased', 0),
+            ):
+                timestamp += self.rng.uniform(*CLICK_DELAY_MS) / 1000
+                events.append({
+                    'type': event_type,
+                    'x': x,
+                    'y': y,
+                    'button': 'left',
+                    'buttons': buttons,
+                    'clickCount': count,
+                    'timestamp': timestamp,
+                })
+        return events
+
+    async def _get_session(self, page: Page) -> Optional[CDPSession]:
+        # One session per page, opened on its first click
+        if page in self._sessions:
+            return self._sessions[page]
+
+        try:
+            session: Optional[CDPSession] = (
+                await page.context.new_cdp_session(page))
+        except Exception:
+            session = None
+        self._sessions[page] = session
+        return session
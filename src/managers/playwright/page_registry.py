@@ -0,0 +1,158 @@
+import asyncio
+from logging import Logger
+from typing import List, Literal, Set, Tuple
+from weakref import WeakKeyDictionary, ref
+
+from patchright.async_api import BrowserContext, Frame, Page
+
+
+PageField = Literal['url', 'title']
+PageWaiter = Tuple[str, PageField, bool, 'asyncio.Future[Page]']
+
+_registries: 'WeakKeyDictionary[BrowserContext, PageRegistry]' = WeakKeyDictionary()
+
+
+class PageRegistry:
+    def __init__(
+        self,
+        browser_context: BrowserContext,
+        logger: Logger,
+    ) -> None:
+        # The registry is the value of a weak-keyed map, a strong reference
+        # back to the context would keep the key alive forever
+        self._browser_context = ref(browser_context)
+        self.logger = logger
+        self.titles: 'WeakKeyDictionary[Page, str]' = WeakKeyDictionary()
+        self.waiters: List[PageWaiter] = []
+        # Titles cost a round trip per page, so they are only tracked once
+        # somebody looks pages up by title
+        self.is_tracking_titles = False
+        self._title_tasks: Set[asyncio.Task] = set()
+
+        browser_context.on('page', self._track)
+        browser_context.on('close', self._on_context_close)
+        for page in browser_context.pages:
+            self._track(page)
+
+    @classmethod
+    def for_context(
+        cls,
+        browser_context: BrowserContext,
+        logger: Logger,
+    ) -> 'PageRegistry':
+        if (registry := _registries.get(browser_context)) is None:
+            registry = cls(browser_context, logger)
+            _registries[browser_context] = registry
+        return registry
+
+    @property
+    def pages(self) -> List[Page]:
+        if (browser_context := self._browser_context()) is None:
+            return []
+        return [page for page in browser_context.pages if not page.is_closed()]
+
+    async def find(
+        self,
+        value: str,
+        type: PageField = 'url',
+        exact: bool = False,
+    ) -> List[Page]:
+        if type == 'title':
+            await self._start_tracking_titles()
+
+        return [
+            page for page in self.pages
+            if self._matches(page, value, type, exact)
+        ]
+
+    async def wait_for_page(
+        self,
+        value: str,
+        type: PageField = 'url',
+        exact: bool = True,
+        timeout: float = 15,
+    ) -> Page:
+        if matched := await self.find(value, type, exact):
+            return matched[0]
+
+        future: asyncio.Future[Page] = asyncio.get_running_loop().create_future()
+        waiter: PageWaiter = (value, type, exact, future)
+        self.waiters.append(waiter)
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            err_msg = f'No page with {type} {value} appeared in {timeout} seconds'
+            self.logger.error(err_msg)
+            raise Exception(err_msg)
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def _track(self, page: Page) -> None:
+        page.on('framenavigated', lambda frame: self._on_navigated(page, frame))
+        page.on('load', lambda _: self._on_load(page))
+        page.on('close', lambda _: self.titles.pop(page, None))
+        self._notify(page)
+
+    def _on_context_close(self, browser_context: BrowserContext) -> None:
+        _registries.pop(browser_context, None)
+
+    def _on_navigated(
+        self,
+        page: Page,
+        frame: Frame,
+    ) -> None:
+        if frame.parent_frame is None:
+            self._notify(page)
+
+    def _on_load(self, page: Page) -> None:
+        if self.is_tracking_titles:
+            self._refresh_title_in_background(page)
+
+    def _notify(self, page: Page) -> None:
+        for waiter in list(self.waiters):
+            value, type, exact, future = waiter
+            if not future.done() and self._matches(page, value, type, exact):
+                future.set_result(page)
+
+    def _matches(
+        self,
+        page: Page,
+        value: str,
+        type: PageField,
+        exact: bool,
+    ) -> bool:
+        if page.is_closed():
+            return False
+
+        current = page.url if type == 'url' else self.titles.get(page, '')
+        if not exact:
+            return value in current
+        if type == 'url':
+            # Extension popups route through the fragment, whatever the
+            # expected URL doesn't spell out (fragment, query) is ignored
+            return current == value or any(
+                current.startswith(value + separator) for separator in '#?')
+        return current == value
+
+    async def _start_tracking_titles(self) -> None:
+        if self.is_tracking_titles:
+            return
+
+        self.is_tracking_titles = True
+        await asyncio.gather(
+            *(self._refresh_title(page) for page in self.pages))
+
+    def _refresh_title_in_background(self, page: Page) -> None:
+        task = asyncio.create_task(self._refresh_title(page))
+        self._title_tasks.add(task)
+        task.add_done_callback(self._title_tasks.discard)
+
+    async def _refresh_title(self, page: Page) -> None:
+        try:
+            self.titles[page] = await page.title()
+        except Exception as e:
+            self.logger.debug(f'Error while reading page title: {e}')
+            return
+        self._notify(page)
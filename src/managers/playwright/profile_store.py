@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from logging import Logger
+from typing import Dict, Iterator, Set, Tuple
+
+from .types import StoredProfileFile
+from src.utils import write_atomic
+
+
+# Only the state an account needs to come back logged in: extension storage,
+# cookies and site storage. Everything else Chromium rebuilds on start.
+PERSISTED_PROFILE_PATHS = (
+    'Default/Local Extension Settings',
+    'Default/Sync Extension Settings',
+    'Default/Managed Extension Settings',
+    'Default/IndexedDB',
+    'Default/Local Storage',
+    'Default/Cookies',
+    'Default/Network/Cookies',
+)
+SKIPPED_FILE_NAMES = {'LOCK', 'Cookies-journal'}
+COMPRESSION_LEVEL = 6
+
+
+class ProfileStore:
+    def __init__(
+        self,
+        store_dir: str,
+        logger: Logger,
+    ) -> None:
+        self.store_dir = os.path.abspath(store_dir)
+        self.blobs_dir = os.path.join(self.store_dir, 'blobs')
+        self.manifests_dir = os.path.join(self.store_dir, 'manifests')
+        self.logger = logger
+
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+    def has(self, key: str) -> bool:
+        return os.path.exists(self._get_manifest_path(key))
+
+    def save(
+        self,
+        key: str,
+        user_data_dir: str,
+    ) -> None:
+        files: Dict[str, StoredProfileFile] = {}
+        new_blobs = 0
+
+        for relative_path, path in self._iter_persisted_files(user_data_dir):
+            with open(path, 'rb') as file:
+                content = file.read()
+
+            digest = hashlib.sha256(content).hexdigest()
+            if self._write_blob(digest, content):
+                new_blobs += 1
+            files[relative_path] = {'hash': digest, 'size': len(content)}
+
+        self._write_json(self._get_manifest_path(key), {
+            'updated_at': time.time(),
+            'files': files,
+        })
+        self.logger.info(
+            f'Saved profile {key}: {len(files)} files, {new_blobs} new blobs')
+
+    def restore(
+        self,
+        key: str,
+        user_data_dir: str,
+    ) -> None:
+        with open(self._get_manifest_path(key)) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        for relative_path, stored_file in manifest['files'].items():
+            path = os.path.join(user_data_dir, *relative_path.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(self._get_blob_path(stored_file['hash']), 'rb') as blob:
+                content = zlib.decompress(blob.read())
+            with open(path, 'wb') as file:
+                file.write(content)
+
+        self.logger.info(
+            f'Restored profile {key}: {len(manifest["files"])} files')
+
+    def prune(self) -> int:
+        referenced: Set[str] = set()
+        for manifest_name in os.listdir(self.manifests_dir):
+            with open(os.path.join(self.manifests_dir, manifest_name)) as file:
+                manifest = json.load(file)
+            referenced.update(
+                stored_file['hash'] for stored_file in manifest['files'].values()
+            )
+
+        removed = 0
+        for prefix in os.listdir(self.blobs_dir):
+            prefix_dir = os.path.join(self.blobs_dir, prefix)
+            for digest in os.listdir(prefix_dir):
+                if digest not in referenced:
+                    os.remove(os.path.join(prefix_dir, digest))
+                    removed += 1
+
+        self.logger.info(f'Pruned {removed} unreferenced profile blobs')
+        return removed
+
+    def _iter_persisted_files(
+        self,
+        user_data_dir: str,
+    ) -> Iterator[Tuple[str, str]]:
+        for persisted_path in PERSISTED_PROFILE_PATHS:
+            path = os.path.join(user_data_dir, *persisted_path.split('/'))
+
+            if os.path.isfile(path):
+                yield persisted_path, path
+                continue
+
+            for root, _, file_names in os.walk(path):
+                for file_name in file_names:
+                    if file_name in SKIPPED_FILE_NAMES:
+                        continue
+                    file_path = os.path.join(root, file_name)
+                    relative_path = os.path.relpath(file_path, user_data_dir)
+                    yield relative_path.replace(os.sep, '/'), file_path
+
+    def _write_blob(
+        self,
+        digest: str,
+        content: bytes,
+    ) -> bool:
+        blob_path = self._get_blob_path(digest)
+        if os.path.exists(blob_path):
+            return False
+
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        write_atomic(blob_path, zlib.compress(content, COMPRESSION_LEVEL))
+        return True
+
+    def _write_json(
+        self,
+        path: str,
+        data: dict,
+    ) -> None:
+        write_atomic(path, json.dumps(data))
+
+    def _get_blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def _get_manifest_path(self, key: str) -> str:
+        safe_key = re.sub(r'[^\w.-]', '_', key)
+        return os.path.join(self.manifests_dir, f'{safe_key}.json')
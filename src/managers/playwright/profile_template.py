@@ -0,0 +1,137 @@
+import os
+import shutil
+import sys
+from logging import Logger
+from typing import Awaitable, Callable, List, Set
+
+from patchright.async_api import BrowserContext
+
+from .base import PlaywrightManager
+from src.utils import sleep
+
+
+# Chromium recreates these on start, cloning them only costs disk writes
+SKIPPED_PROFILE_ENTRIES = {
+    'SingletonLock',
+    'SingletonSocket',
+    'SingletonCookie',
+    'lockfile',
+    'Cache',
+    'Code Cache',
+    'GPUCache',
+    'GrShaderCache',
+    'GraphiteDawnCache',
+    'ShaderCache',
+    'DawnCache',
+    'component_crx_cache',
+    'Crashpad',
+}
+# LevelDB never rewrites table files in place, so they are safe to share
+# between profiles through hardlinks
+IMMUTABLE_FILE_SUFFIXES = ('.ldb', '.sst')
+TEMPLATE_READY_MARKER = '.template-ready'
+FICLONE = 0x40049409
+
+
+class ProfileTemplate:
+    def __init__(
+        self,
+        template_dir: str,
+        logger: Logger,
+    ) -> None:
+        self.template_dir = os.path.abspath(template_dir)
+        self.logger = logger
+        self.is_reflink_supported = sys.platform.startswith('linux')
+
+    def is_ready(self) -> bool:
+        return os.path.exists(
+            os.path.join(self.template_dir, TEMPLATE_READY_MARKER))
+
+    async def build(
+        self,
+        launcher: Callable[[str], Awaitable[BrowserContext]],
+        boot_timeout: int = 15,
+        settle_delay: float = 3,
+    ) -> None:
+        self.logger.info(f'Building profile template in {self.template_dir}...')
+
+        shutil.rmtree(self.template_dir, ignore_errors=True)
+        os.makedirs(self.template_dir)
+
+        browser_context = await launcher(self.template_dir)
+        try:
+            pw_manager = PlaywrightManager(browser_context, self.logger)
+            if not await pw_manager.wait_for_extension(boot_timeout):
+                err_msg = 'Extension hasn\'t booted while building template'
+                self.logger.error(err_msg)
+                raise Exception(err_msg)
+
+            # Lets the extension finish its first-run writes to storage
+            await sleep(settle_delay, self.logger)
+        finally:
+            await browser_context.close()
+
+        with open(os.path.join(self.template_dir, TEMPLATE_READY_MARKER), 'w'):
+            pass
+
+    def clone(
+        self,
+        target_dir: str,
+    ) -> str:
+        if not self.is_ready():
+            err_msg = f'Profile template {self.template_dir} is not built'
+            self.logger.error(err_msg)
+            raise Exception(err_msg)
+
+        shutil.copytree(
+            self.template_dir,
+            target_dir,
+            ignore=self._ignore_entries,
+            copy_function=self._clone_file,
+            dirs_exist_ok=True,
+        )
+        return target_dir
+
+    def _ignore_entries(
+        self,
+        directory: str,
+        entries: List[str],
+    ) -> Set[str]:
+        return {
+            entry for entry in entries
+            if entry in SKIPPED_PROFILE_ENTRIES or entry == TEMPLATE_READY_MARKER
+        }
+
+    def _clone_file(
+        self,
+        src: str,
+        dst: str,
+    ) -> str:
+        if src.endswith(IMMUTABLE_FILE_SUFFIXES):
+            try:
+                os.link(src, dst)
+                return dst
+            except OSError:
+                pass
+
+        if self.is_reflink_supported:
+            try:
+                self._reflink(src, dst)
+                return dst
+            except OSError:
+                self.is_reflink_supported = False
+                if os.path.exists(dst):
+                    os.remove(dst)
+
+        return shutil.copy2(src, dst)
+
+    def _reflink(
+        self,
+        src: str,
+        dst: str,
+    ) -> None:
+        import fcntl
+
+        with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        shutil.copystat(src, dst)
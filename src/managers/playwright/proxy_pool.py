@@ -0,0 +1,358 @@
+import asyncio
+import base64
+import time
+from collections import Counter
+from logging import Logger
+from typing import Dict, List, Optional, Sequence, Set
+from urllib.parse import urlparse
+
+from patchright.async_api import ProxySettings
+
+
+PROXY_SCHEMES = ('http', 'https', 'socks4', 'socks5')
+# Chromium reports a broken proxy with one of these network errors
+PROXY_ERRORS = ('ERR_PROXY', 'ERR_TUNNEL', 'ERR_SOCKS')
+
+
+def parse_proxy(
+    proxy: str,
+    proxy_type: Optional[str] = None,
+) -> ProxySettings:
+    if '://' in proxy:
+        scheme, proxy = proxy.split('://', 1)
+    else:
+        scheme = proxy_type or 'http'
+    scheme = scheme.lower()
+
+    username = password = None
+    if '@' in proxy:
+        credentials, address = proxy.rsplit('@', 1)
+        username, _, password = credentials.partition(':')
+    elif proxy.startswith('['):
+        # The colons of a bracketed IPv6 host are not separators
+        host, _, rest = proxy.partition(']')
+        port, _, credentials = rest.partition(':')[2].partition(':')
+        address = f'{host}]:{port}'
+        if credentials:
+            username, _, password = credentials.partition(':')
+    elif proxy.count(':') == 3:
+        host, port, username, password = proxy.split(':')
+        address = f'{host}:{port}'
+    else:
+        address = proxy
+
+    host, _, port = address.rpartition(':')
+    if scheme not in PROXY_SCHEMES or not host or not port.isdigit():
+        raise Exception(f'Invalid proxy {proxy}')
+
+    settings: ProxySettings = {'server': f'{scheme}://{host}:{port}'}
+    if username:
+        settings['username'] = username
+        settings['password'] = password or ''
+    return settings
+
+
+def is_proxy_error(error: BaseException) -> bool:
+    return any(code in str(error) for code in PROXY_ERRORS)
+
+
+class ProxyState:
+    def __init__(
+        self,
+        settings: ProxySettings,
+    ) -> None:
+        self.settings = settings
+        self.latency: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probed_at = 0.0
+
+    @property
+    def key(self) -> str:
+        return get_proxy_key(self.settings)
+
+    @property
+    def failure_rate(self) -> float:
+        total = self.successes + self.failures
+        return self.failures / total if total else 0
+
+    def is_available(self) -> bool:
+        return self.open_until <= time.monotonic()
+
+
+def get_proxy_key(settings: ProxySettings) -> str:
+    return f'{settings.get("username") or ""}@{settings["server"]}'
+
+
+class ProxyPool:
+    def __init__(
+        self,
+        logger: Logger,
+        proxies: Sequence[str] = (),
+        proxy_type: Optional[str] = None,
+        probe_target: str = 'openion.com:443',
+        probe_interval: float = 30,
+        probe_timeout: float = 5,
+        failure_threshold: int = 3,
+        cooldown: float = 60,
+    ) -> None:
+        self.logger = logger
+        self.probe_target = probe_target
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.states: Dict[str, ProxyState] = {}
+        # Only shared proxies are handed out, account proxies stay with
+        # their account
+        self.shared: List[ProxyState] = [
+            self._register(parse_proxy(proxy, proxy_type)) for proxy in proxies
+        ]
+        self.assignments: Dict[str, ProxyState] = {}
+        # Accounts currently on each shared proxy, kept in step with
+        # assignments so picking a proxy doesn't scan them all
+        self.load: 'Counter[str]' = Counter()
+        self._prober: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if not self.shared:
+            return
+
+        self.logger.info(f'Probing {len(self.shared)} proxies...')
+        await self._probe_all()
+        self._prober = asyncio.create_task(self._probe_periodically())
+
+    async def close(self) -> None:
+        if self._prober:
+            self._prober.cancel()
+            try:
+                await self._prober
+            except asyncio.CancelledError:
+                pass
+            self._prober = None
+
+    async def acquire(
+        self,
+        account_key: str,
+        proxy: Optional[str] = None,
+        proxy_type: Optional[str] = None,
+    ) -> Optional[ProxySettings]:
+        if proxy:
+            state = self._register(parse_proxy(proxy, proxy_type))
+            if not await self._check(state):
+                raise Exception(
+                    f'Proxy {state.settings["server"]} of account '
+                    f'{account_key} is unhealthy'
+                )
+            return state.settings
+
+        if not self.shared:
+            return None
+
+        rejected: Set[str] = set()
+        state = self.assignments.get(account_key)
+        while True:
+            if not state or state.key in rejected or not state.is_available():
+                state = self._pick(rejected)
+            if await self._check(state):
+                self._assign(account_key, state)
+                return state.settings
+            rejected.add(state.key)
+
+    def release(self, account_key: str) -> None:
+        if (state := self.assignments.pop(account_key, None)) is None:
+            return
+
+        self.load[state.key] -= 1
+        if self.load[state.key] <= 0:
+            del self.load[state.key]
+
+    def report_success(self, settings: ProxySettings) -> None:
+        if state := self.states.get(get_proxy_key(settings)):
+            state.successes += 1
+            state.consecutive_failures = 0
+
+    def report_failure(self, settings: ProxySettings) -> None:
+        if not (state := self.states.get(get_proxy_key(settings))):
+            return
+
+        state.failures += 1
+        state.consecutive_failures += 1
+        if state.consecutive_failures >= self.failure_threshold:
+            self._open(
+                state, f'failed {state.consecutive_failures} times in a row')
+
+    async def probe(self, state: ProxyState) -> None:
+        state.probed_at = time.monotonic()
+        started_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                self._handshake(state.settings), self.probe_timeout)
+        except Exception as e:
+            self.logger.debug(
+                f'Proxy {state.settings["server"]} probe failed: {e!r}')
+            # A proxy that can't complete a handshake would fail every
+            # account handed to it, so the breaker opens right away and
+            # the next probe after the cooldown decides whether it's back
+            state.failures += 1
+            state.consecutive_failures += 1
+            self._open(state, 'failed its probe')
+            return
+
+        latency = time.perf_counter() - started_at
+        state.latency = (
+            latency if state.latency is None
+            else state.latency * 0.7 + latency * 0.3
+        )
+        state.open_until = 0
+        self.report_success(state.settings)
+
+    def report(self) -> None:
+        for state in self.states.values():
+            latency = (
+                f'{state.latency * 1000:.0f} ms'
+                if state.latency is not None else 'unknown'
+            )
+            self.logger.info(
+                f'Proxy {state.settings["server"]}: latency {latency}, '
+                f'{state.successes} ok, {state.failures} failed'
+            )
+
+    def _register(self, settings: ProxySettings) -> ProxyState:
+        key = get_proxy_key(settings)
+        if (state := self.states.get(key)) is None:
+            state = ProxyState(settings)
+            self.states[key] = state
+        return state
+
+    def _open(
+        self,
+        state: ProxyState,
+        reason: str,
+    ) -> None:
+        state.open_until = time.monotonic() + self.cooldown
+        self.logger.warning(
+            f'Proxy {state.settings["server"]} {reason}, '
+            f'skipping it for {self.cooldown} seconds'
+        )
+
+    async def _check(self, state: ProxyState) -> bool:
+        # A proxy nobody probed recently is checked before Chromium spends
+        # its whole retry budget on it
+        if time.monotonic() - state.probed_at > self.probe_interval:
+            await self.probe(state)
+        return state.is_available()
+
+    def _pick(self, rejected: Set[str]) -> ProxyState:
+        if not (available := [
+            state for state in self.shared
+            if state.is_available() and state.key not in rejected
+        ]):
+            raise Exception('No healthy proxies left in the pool')
+
+        return min(available, key=self._score)
+
+    def _assign(
+        self,
+        account_key: str,
+        state: ProxyState,
+    ) -> None:
+        if self.assignments.get(account_key) is state:
+            return
+
+        self.release(account_key)
+        self.assignments[account_key] = state
+        self.load[state.key] += 1
+
+    def _score(self, state: ProxyState) -> float:
+        latency = (
+            state.latency if state.latency is not None else self.probe_timeout
+        )
+        # Spread accounts across proxies of similar quality
+        load = 1 + 0.1 * self.load[state.key]
+        return latency * (1 + 4 * state.failure_rate) * load
+
+    async def _probe_all(self) -> None:
+        # Broken proxies wait out their cooldown before being probed again
+        await asyncio.gather(*(
+            self.probe(state) for state in self.states.values()
+            if state.is_available()
+        ))
+
+    async def _probe_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            await self._probe_all()
+
+    async def _handshake(self, settings: ProxySettings) -> None:
+        proxy_url = urlparse(settings['server'])
+        reader, writer = await asyncio.open_connection(
+            proxy_url.hostname,
+            proxy_url.port,
+            ssl=proxy_url.scheme == 'https' or None,
+        )
+        try:
+            if proxy_url.scheme.startswith('socks'):
+                await self._socks_handshake(
+                    reader, writer, proxy_url.scheme, settings)
+            else:
+                await self._connect_handshake(reader, writer, settings)
+        finally:
+            writer.close()
+
+    async def _connect_handshake(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        settings: ProxySettings,
+    ) -> None:
+        request = (
+            f'CONNECT {self.probe_target} HTTP/1.1\r\n'
+            f'Host: {self.probe_target}\r\n'
+        )
+        if username := settings.get('username'):
+            token = base64.b64encode(
+                f'{username}:{settings.get("password", "")}'.encode()).decode()
+            request += f'Proxy-Authorization: Basic {token}\r\n'
+        writer.write(f'{request}\r\n'.encode())
+        await writer.drain()
+
+        status_line = (await reader.readline()).decode(errors='replace')
+        if len(parts := status_line.split()) < 2 or parts[1] != '200':
+            raise Exception(f'CONNECT answered with {status_line.strip()!r}')
+
+    async def _socks_handshake(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        scheme: str,
+        settings: ProxySettings,
+    ) -> None:
+        if scheme == 'socks4':
+            # Only checks that something listens, SOCKS4 has no greeting
+            return
+
+        username = settings.get('username')
+        # No authentication, plus username/password when there are
+        # credentials to offer
+        methods = b'\x00\x02' if username else b'\x00'
+        writer.write(b'\x05' + bytes([len(methods)]) + methods)
+        await writer.drain()
+        version, method = await reader.readexactly(2)
+        if version != 5 or method not in methods:
+            raise Exception('SOCKS5 proxy rejected the greeting')
+
+        if method == 2:
+            # RFC 1929 username/password sub-negotiation
+            user = username.encode()
+            password = (settings.get('password') or '').encode()
+            writer.write(
+                b'\x01' + bytes([len(user)]) + user
+                + bytes([len(password)]) + password
+            )
+            await writer.drain()
+            if (await reader.readexactly(2))[1] != 0:
+                raise Exception('SOCKS5 proxy rejected the credentials')
@@ -0,0 +1,162 @@
+import asyncio
+import random
+import time
+from logging import Logger
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from src.deadline import DeadlineExceeded, get_remaining
+from src.logging_setup import CHATTER
+from src.tracing import record_attempt, record_sleep
+
+
+T = TypeVar('T')
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        delay: float = 0.5,
+        max_delay: float = 4,
+        backoff: float = 2,
+        jitter: float = 0.2,
+        attempt_timeout: float = 10,
+        deadline: Optional[float] = None,
+    ) -> None:
+        self.max_attempts = max(1, max_attempts)
+        self.delay = delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+
+    def override(
+        self,
+        max_attempts: Optional[int] = None,
+        delay: Optional[float] = None,
+        attempt_timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> 'RetryPolicy':
+        return RetryPolicy(
+            max_attempts=(
+                self.max_attempts if max_attempts is None else max_attempts),
+            delay=self.delay if delay is None else delay,
+            max_delay=self.max_delay,
+            backoff=self.backoff,
+            jitter=self.jitter,
+            attempt_timeout=(
+                self.attempt_timeout if attempt_timeout is None
+                else attempt_timeout
+            ),
+            deadline=self.deadline if deadline is None else deadline,
+        )
+
+    def get_delay(self, attempt: int) -> float:
+        delay = min(self.delay * self.backoff ** attempt, self.max_delay)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def run(
+        self,
+        action: Callable[[float], Awaitable[T]],
+        logger: Optional[Logger] = None,
+        show_attempt_log: bool = False,
+    ) -> T:
+        """
+        Calls `action(timeout)` until it succeeds, sleeping only between
+        failed attempts. `timeout` is the per-attempt budget in seconds,
+        cut down to whatever is left of the overall deadline and of the
+        account's budget.
+        """
+        started_at = time.monotonic()
+        last_error: Optional[Exception] = None
+        attempt = 0
+        # Set when the account's budget, not this policy's own deadline, is
+        # what stopped the retries
+        is_account_budget_spent = False
+
+        while attempt < self.max_attempts:
+            timeout = self.attempt_timeout
+            if (remaining := self._get_remaining(started_at)) is not None:
+                if remaining <= 0:
+                    is_account_budget_spent = self._is_account_budget_spent(0)
+                    break
+                timeout = min(timeout, remaining)
+
+            record_attempt()
+            try:
+                return await action(timeout)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                last_error = e
+                attempt += 1
+                if logger and show_attempt_log:
+                    logger.warning(
+                        'Attempt %s of %s', attempt, self.max_attempts,
+                        extra=CHATTER)
+
+            if attempt >= self.max_attempts:
+                break
+
+            delay = self.get_delay(attempt - 1)
+            if (remaining := self._get_remaining(started_at)) is not None:
+                if delay >= remaining:
+                    is_account_budget_spent = (
+                        self._is_account_budget_spent(delay))
+                    break
+            record_sleep(delay)
+            await asyncio.sleep(delay)
+
+        if is_account_budget_spent:
+            raise DeadlineExceeded(
+                f'Account deadline exceeded after {attempt} attempts in '
+                f'{time.monotonic() - started_at:.1f} seconds: {last_error}'
+            )
+        if last_error is None:
+            raise Exception(
+                'Deadline ran out before the first attempt, '
+                f'{time.monotonic() - started_at:.1f} seconds in'
+            )
+        raise Exception(
+            f'Failed after {attempt} attempts in '
+            f'{time.monotonic() - started_at:.1f} seconds: {last_error}'
+        )
+
+    def _is_account_budget_spent(self, needed: float) -> bool:
+        remaining = get_remaining()
+        return remaining is not None and needed >= remaining
+
+    def _get_remaining(self, started_at: float) -> Optional[float]:
+        remaining = get_remaining()
+        if self.deadline is not None:
+            own = self.deadline - (time.monotonic() - started_at)
+            remaining = own if remaining is None else min(remaining, own)
+        return remaining
+
+CLICK_RETRY_POLICY = RetryPolicy(
+    max_attempts=5,
+    delay=0.5,
+    attempt_timeout=10,
+    deadline=30,
+)
+CLICK_BY_CORDS_RETRY_POLICY = RetryPolicy(
+    max_attempts=5,
+    delay=0.5,
+    attempt_timeout=30,
+    deadline=60,
+)
+GET_ELEMENT_RETRY_POLICY = RetryPolicy(
+    max_attempts=3,
+    delay=0.3,
+    max_delay=1,
+    attempt_timeout=3,
+    deadline=10,
+)
+INPUT_RETRY_POLICY = RetryPolicy(
+    max_attempts=3,
+    delay=0.3,
+    max_delay=1,
+    attempt_timeout=2,
+    deadline=8,
+)
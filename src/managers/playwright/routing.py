@@ -0,0 +1,155 @@
+import asyncio
+import re
+from collections import Counter
+from logging import Logger
+from typing import Dict, List, Optional, Pattern, Set, Tuple, Union
+
+from patchright.async_api import Request, Route
+
+from .types import RouteRule, RoutingStats
+
+
+# Blocked requests are never downloaded, so the first one of every resource
+# type and then one in this many are let through and measured instead. Their
+# sizes and load times stand in for the ones that were blocked.
+SAMPLE_EVERY = 50
+
+
+class RequestRouter:
+    def __init__(
+        self,
+        logger: Logger,
+        sample_every: int = SAMPLE_EVERY,
+    ) -> None:
+        self.logger = logger
+        self.sample_every = sample_every
+        self.rules: List[Tuple[str, RouteRule, Optional[Pattern[str]]]] = []
+        self.allowed = 0
+        self.blocked_by_type: Counter[str] = Counter()
+        self.blocked_by_scope: Counter[str] = Counter()
+        self.sampled_by_type: Counter[str] = Counter()
+        self.measured_by_type: Counter[str] = Counter()
+        self.measured_bytes: Counter[str] = Counter()
+        self.measured_seconds: Counter[str] = Counter()
+        self._measure_tasks: Set[asyncio.Task] = set()
+
+    def add_rules(
+        self,
+        scope: str,
+        rules: List[RouteRule],
+    ) -> None:
+        for rule in rules:
+            pattern = rule.get('url_pattern')
+            self.rules.append(
+                (scope, rule, re.compile(pattern) if pattern else None))
+
+    def get_url_matcher(self) -> Union[str, Pattern[str]]:
+        # Matched by the driver, requests no rule could apply to never
+        # reach Python. A rule without a URL pattern needs to see them all.
+        patterns = [pattern for _, _, pattern in self.rules]
+        if not patterns or None in patterns:
+            return '**/*'
+        return re.compile('|'.join(
+            f'(?:{pattern.pattern})' for pattern in patterns if pattern))
+
+    async def handle(
+        self,
+        route: Route,
+        request: Request,
+    ) -> None:
+        if (match := self._match(request)) and match[1]['action'] == 'block':
+            resource_type = request.resource_type
+            if self._should_sample(resource_type):
+                self.sampled_by_type[resource_type] += 1
+                await route.fallback()
+                self._measure_in_background(request)
+                return
+
+            self.blocked_by_type[resource_type] += 1
+            self.blocked_by_scope[match[0]] += 1
+            await route.abort('blockedbyclient')
+            return
+
+        self.allowed += 1
+        await route.fallback()
+
+    def get_stats(self) -> RoutingStats:
+        blocked_bytes = 0.0
+        saved_seconds = 0.0
+        # Types nothing was measured for yet don't count towards the savings
+        for resource_type, measured in self.measured_by_type.items():
+            blocked = self.blocked_by_type[resource_type]
+            blocked_bytes += (
+                self.measured_bytes[resource_type] / measured * blocked)
+            saved_seconds += (
+                self.measured_seconds[resource_type] / measured * blocked)
+
+        return {
+            'allowed': self.allowed,
+            'blocked': sum(self.blocked_by_type.values()),
+            'blocked_by_type': dict(self.blocked_by_type),
+            'sampled': sum(self.sampled_by_type.values()),
+            'blocked_bytes': round(blocked_bytes),
+            'saved_seconds': saved_seconds,
+        }
+
+    def report(self) -> RoutingStats:
+        stats = self.get_stats()
+        by_scope: Dict[str, int] = dict(self.blocked_by_scope)
+        # Only requests matching a rule's URL pattern are counted as allowed
+        self.logger.info(
+            f'Routing: allowed {stats["allowed"]} matched requests, blocked '
+            f'{stats["blocked"]} {stats["blocked_by_type"]} by {by_scope}, '
+            f'{stats["blocked_bytes"] / 1_000_000:.1f} MB and '
+            f'{stats["saved_seconds"]:.1f} seconds of loading saved, as '
+            f'measured on {stats["sampled"]} requests let through'
+        )
+        return stats
+
+    def _should_sample(self, resource_type: str) -> bool:
+        if not self.sample_every:
+            return False
+        if not self.sampled_by_type[resource_type]:
+            return True
+        matched = (
+            self.blocked_by_type[resource_type]
+            + self.sampled_by_type[resource_type]
+        )
+        return matched % self.sample_every == 0
+
+    def _measure_in_background(self, request: Request) -> None:
+        task = asyncio.create_task(self._measure(request))
+        self._measure_tasks.add(task)
+        task.add_done_callback(self._measure_tasks.discard)
+
+    async def _measure(self, request: Request) -> None:
+        try:
+            if not (response := await request.response()):
+                return
+            await response.finished()
+            sizes = await request.sizes()
+        except Exception as e:
+            self.logger.debug(f'Error while measuring a sampled request: {e}')
+            return
+
+        resource_type = request.resource_type
+        self.measured_by_type[resource_type] += 1
+        self.measured_bytes[resource_type] += (
+            sizes['responseHeadersSize'] + sizes['responseBodySize'])
+        # Milliseconds since the request started, -1 when unknown
+        if (response_end := request.timing.get('responseEnd', -1)) > 0:
+            self.measured_seconds[resource_type] += response_end / 1000
+
+    def _match(
+        self,
+        request: Request,
+    ) -> Optional[Tuple[str, RouteRule]]:
+        for scope, rule, pattern in self.rules:
+            resource_types = rule.get('resource_types')
+            if resource_types and request.resource_type not in resource_types:
+                continue
+            if pattern and not pattern.search(request.url):
+                continue
+            return scope, rule
+
+        return None
@@ -1,9 +1,11 @@
 from enum import Enum
-from typing import TypedDict
+from typing import Dict, List, Literal, TypedDict
 from typing_extensions import NotRequired
 
 from patchright.async_api import Page
 
+from .retry import RetryPolicy
+
 
 class BaseProps(TypedDict):
     page: Page
@@ -18,6 +20,8 @@ class ClickProps(BaseProps):
     delay_between_attempts: NotRequired[int]
     show_attempt_log: NotRequired[bool]
     click_count: NotRequired[int]
+    retry_policy: NotRequired[RetryPolicy]
+    deadline: NotRequired[float]
 
 
 class ClickByCordsProps(ClickProps):
@@ -32,6 +36,8 @@ class GetElementProps(BaseProps):
     delay_to_wait_element: NotRequired[int]
     delay_between_attempts: NotRequired[int]
     show_attempt_log: NotRequired[bool]
+    retry_policy: NotRequired[RetryPolicy]
+    deadline: NotRequired[float]
 
 
 class GetElementAttributeProps(BaseProps):
@@ -47,6 +53,79 @@ class ClickOnElementOptions(TypedDict):
 class TypeInInputOptions(TypedDict):
     is_required: NotRequired[bool]
     wait_time: NotRequired[int]
+    retry_policy: NotRequired[RetryPolicy]
+    deadline: NotRequired[float]
     page: Page
     locator: str
     text: str
+
+
+class ContextPoolConfig(TypedDict):
+    size: int
+    max_uses: NotRequired[int]
+    reset_mode: NotRequired[Literal['reset', 'replace']]
+    user_data_root: NotRequired[str]
+    extension_boot_timeout: NotRequired[int]
+    close_timeout: NotRequired[float]
+
+
+class LaunchProfile(TypedDict):
+    headless: bool
+    args: List[str]
+    viewport: NotRequired[Dict[str, int]]
+
+
+class Fingerprint(TypedDict):
+    # Left out when the Chromium version is unknown
+    user_agent: NotRequired[str]
+    viewport: Dict[str, int]
+    locale: str
+    timezone_id: str
+
+
+class StoredProfileFile(TypedDict):
+    hash: str
+    size: int
+
+
+class FlowStep(TypedDict):
+    action: Literal[
+        'open_page',
+        'click',
+        'fill',
+        'expect_url',
+        'wait_popup',
+        'close_page',
+    ]
+    locator: NotRequired[str]
+    text: NotRequired[str]
+    url: NotRequired[str]
+    timeout: NotRequired[float]
+    click_count: NotRequired[int]
+    trusted: NotRequired[bool]
+
+
+class RouteRule(TypedDict):
+    action: Literal['allow', 'block']
+    resource_types: NotRequired[List[str]]
+    url_pattern: NotRequired[str]
+
+
+class RoutingStats(TypedDict):
+    allowed: int
+    blocked: int
+    blocked_by_type: Dict[str, int]
+    # Requests a block rule matched but that were let through to be measured
+    sampled: int
+    blocked_bytes: int
+    # Summed load time of the blocked requests, parallel loads overlap so
+    # the wall time saved is at most this
+    saved_seconds: float
+
+
+class CachedAsset(TypedDict):
+    hash: str
+    size: int
+    status: int
+    headers: Dict[str, str]
+    expires_at: float
@@ -1,4 +1,82 @@
-RABBY_WALLET_URL = 'chrome-extension://mhmoonbcjahgigdhnmnlnppcgnlkmjim/index.html#/new-user/guide'
+from typing import List
+
+from src.managers.playwright.types import FlowStep
+
+
+RABBY_STORE_ID = 'mhmoonbcjahgigdhnmnlnppcgnlkmjim'
+# URL templates, `store_id` is the id the extension got in this browser
+RABBY_WALLET_URL = 'chrome-extension://{store_id}/index.html#/new-user/guide'
+RABBY_UNLOCK_URL = 'chrome-extension://{store_id}/index.html#/unlock'
+CONTROLLER_TIMEOUT = 10
+
+# Calls the wallet controller of the background the way Rabby's own popup
+# does, over a runtime port with its request/response envelope. Runs in the
+# main world of an extension page, the only place with chrome.runtime.
+# `is_found` stays false as long as nothing was changed, so the UI flow can
+# still take over.
+CONTROLLER_IMPORT_SCRIPT = '''
+async ([privateKey, password, timeout]) => {
+    if (typeof chrome === 'undefined' || !chrome.runtime?.connect) {
+        return {is_found: false, error: 'chrome.runtime is not available'};
+    }
+
+    const port = chrome.runtime.connect({name: 'popup'});
+    const pending = new Map();
+    let nextIdent = 0;
+    let disconnectError = null;
+    // A build without the port listener drops the port right away, every
+    // call fails then instead of waiting for its timeout
+    port.onDisconnect.addListener(() => {
+        disconnectError = new Error(
+            chrome.runtime.lastError?.message || 'Rabby port was disconnected');
+        for (const {reject} of pending.values()) reject(disconnectError);
+        pending.clear();
+    });
+    port.onMessage.addListener((message) => {
+        const data = message?.data;
+        if (message?._type_ !== 'ETH_WALLET_response' || !pending.has(data?.ident)) {
+            return;
+        }
+        const {resolve, reject} = pending.get(data.ident);
+        pending.delete(data.ident);
+        data.err ? reject(new Error(data.err.message || String(data.err))) : resolve(data.res);
+    });
+    const call = (method, ...params) => new Promise((resolve, reject) => {
+        if (disconnectError) {
+            reject(disconnectError);
+            return;
+        }
+        const ident = nextIdent++;
+        pending.set(ident, {resolve, reject});
+        port.postMessage({
+            _type_: 'ETH_WALLET_request',
+            data: {ident, data: {type: 'controller', method, params}},
+        });
+        setTimeout(() => {
+            if (pending.delete(ident)) reject(new Error(`${method} timed out`));
+        }, timeout);
+    });
+
+    try {
+        let isBooted;
+        try {
+            isBooted = await call('isBooted');
+        } catch (e) {
+            return {is_found: false, error: String(e)};
+        }
+
+        try {
+            await call(isBooted ? 'unlock' : 'boot', password);
+            await call('importPrivateKey', privateKey);
+            return {is_found: true, error: null};
+        } catch (e) {
+            return {is_found: true, error: String(e)};
+        }
+    } finally {
+        if (!disconnectError) port.disconnect();
+    }
+}
+'''
 
 
 class RabbyXPath:
@@ -10,3 +88,30 @@ class RabbyXPath:
     CONFIRM_PASSWORD = '//*[@id="confirmPassword"]'
     CONFIRM_IMPORT = '//*[@id="root"]/div/div/div/form/footer/button'
     DONE_BUTTON = '//*[@id="root"]/div/div/button'
+
+
+IMPORT_BY_PRIVATE_KEY_FLOW: List[FlowStep] = [
+    {'action': 'open_page', 'url': RABBY_WALLET_URL},
+    {'action': 'expect_url', 'url': RABBY_WALLET_URL},
+    {'action': 'click', 'locator': RabbyXPath.I_ALREADY_HAVE_AN_ACCOUNT},
+    {'action': 'click', 'locator': RabbyXPath.PRIVATE_KEY},
+    {
+        'action': 'fill',
+        'locator': RabbyXPath.PRIVATE_KEY_INPUT,
+        'text': '{private_key}',
+    },
+    {'action': 'click', 'locator': RabbyXPath.CONFIRM},
+    {
+        'action': 'fill',
+        'locator': RabbyXPath.ENTER_PASSWORD,
+        'text': '{password}',
+    },
+    {
+        'action': 'fill',
+        'locator': RabbyXPath.CONFIRM_PASSWORD,
+        'text': '{password}',
+    },
+    {'action': 'click', 'locator': RabbyXPath.CONFIRM_IMPORT},
+    {'action': 'click', 'locator': RabbyXPath.DONE_BUTTON},
+    {'action': 'close_page'},
+]
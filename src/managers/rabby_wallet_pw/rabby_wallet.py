@@ -1,13 +1,25 @@
 import asyncio
-from faker import Faker
+from typing import Optional
+
 from patchright.async_api import (
     BrowserContext,
+    Page,
     expect,
 )
 
-from .constants import RABBY_WALLET_URL, RabbyXPath
+from .constants import (
+    CONTROLLER_IMPORT_SCRIPT,
+    CONTROLLER_TIMEOUT,
+    IMPORT_BY_PRIVATE_KEY_FLOW,
+    RABBY_STORE_ID,
+    RABBY_UNLOCK_URL,
+    RABBY_WALLET_URL,
+    RabbyXPath,
+)
 from .types import Config
-from ..playwright import PlaywrightManager
+from ..playwright import FlowExecutor, PlaywrightManager
+from src.deadline import cap_timeout
+from src.tracing import traced
 
 
 class RabbyWalletWithPlaywright:
@@ -17,11 +29,14 @@ class RabbyWalletWithPlaywright:
         browser_context: BrowserContext,
     ) -> None:
         self.logger = config.get('logger')
-        self.store_identificator = config.get('store_identificator', '')
+        self.store_identificator = (
+            config.get('store_identificator') or RABBY_STORE_ID)
+        self.use_controller = config.get('use_controller', True)
         self.pw_manager = PlaywrightManager(
             browser_context=browser_context,
             logger=self.logger,
         )
+        self.flow_executor = FlowExecutor(self.pw_manager)
 
     def _exist_check(
         self,
@@ -35,58 +50,99 @@ class RabbyWalletWithPlaywright:
         self.logger.error(err_msg)
         raise Exception(err_msg)
 
-    async def import_by_private_key(self, private_key: str):
+    @traced()
+    async def import_by_private_key(
+        self,
+        private_key: str,
+        password: Optional[str] = None,
+        close_blank_pages: bool = True,
+    ):
         self.logger.info('Importing Rabby Wallet by private key...')
 
-        evm_password = Faker().password(
-            length=16,
-            special_chars=True,
-            digits=True,
-            upper_case=True,
+        if not (evm_password := password):
+            # Faker loads all of its providers on import
+            from faker import Faker
+            evm_password = Faker().password(
+                length=16,
+                special_chars=True,
+                digits=True,
+                upper_case=True,
+            )
+
+        if close_blank_pages:
+            for current_page in self.pw_manager.browser_context.pages:
+                if current_page.url == 'about:blank':
+                    _ = asyncio.create_task(
+                        self.pw_manager.close_page(current_page, delay=2),
+                    )
+
+        variables = {
+            'store_id': self.store_identificator,
+            'private_key': private_key,
+            'password': evm_password,
+        }
+        if not self.use_controller:
+            await self.flow_executor.run(
+                IMPORT_BY_PRIVATE_KEY_FLOW,
+                variables=variables,
+            )
+            return
+
+        page = await self.pw_manager.open_page(
+            url=RABBY_WALLET_URL.format(store_id=self.store_identificator),
         )
+        if await self._import_with_controller(page, private_key, evm_password):
+            await self.pw_manager.close_page(page, delay=0)
+            return
 
-        for current_page in self.pw_manager.browser_context.pages:
-            if current_page.url == 'about:blank':
-                _ = asyncio.create_task(
-                    self.pw_manager.close_page(current_page, delay=2),
-                )
+        self.logger.info('Importing Rabby Wallet through the UI...')
+        # The onboarding page is already open, the flow goes on from there
+        await self.flow_executor.run(
+            IMPORT_BY_PRIVATE_KEY_FLOW[1:],
+            page=page,
+            variables=variables,
+        )
 
-        page = await self.pw_manager.open_page(url=RABBY_WALLET_URL)
-        await expect(page).to_have_url(RABBY_WALLET_URL)
+    @traced()
+    async def _import_with_controller(
+        self,
+        page: Page,
+        private_key: str,
+        password: str,
+    ) -> bool:
+        try:
+            result = await page.evaluate(
+                CONTROLLER_IMPORT_SCRIPT,
+                [private_key, password, cap_timeout(CONTROLLER_TIMEOUT) * 1000],
+                isolated_context=False,
+            )
+        except Exception as e:
+            self.logger.warning('Rabby controller call failed: %s', e)
+            return False
 
-        await self.pw_manager.click({
-            'page': page,
-            'locator': RabbyXPath.I_ALREADY_HAVE_AN_ACCOUNT,
-        })
-        await self.pw_manager.click({
-            'page': page,
-            'locator': RabbyXPath.PRIVATE_KEY,
-        })
-        await self.pw_manager.type_in_input({
-            'page': page,
-            'locator': RabbyXPath.PRIVATE_KEY_INPUT,
-            'text': private_key,
-        })
-        await self.pw_manager.click({
-            'page': page,
-            'locator': RabbyXPath.CONFIRM,
-        })
+        if not result['is_found']:
+            self.logger.info(
+                'Rabby controller is not available: %s', result['error'])
+            return False
+        if error := result['error']:
+            err_msg = f'Error while importing through Rabby controller: {error}'
+            self.logger.error(err_msg)
+            raise Exception(err_msg)
+
+        self.logger.info('Imported Rabby Wallet through its controller')
+        return True
+
+    @traced()
+    async def unlock(self, password: str):
+        self.logger.info('Unlocking Rabby Wallet...')
+
+        unlock_url = RABBY_UNLOCK_URL.format(store_id=self.store_identificator)
+        page = await self.pw_manager.open_page(url=unlock_url)
         await self.pw_manager.type_in_input({
             'page': page,
             'locator': RabbyXPath.ENTER_PASSWORD,
-            'text': evm_password,
-        })
-        await self.pw_manager.type_in_input({
-            'page': page,
-            'locator': RabbyXPath.CONFIRM_PASSWORD,
-            'text': evm_password,
-        })
-        await self.pw_manager.click({
-            'page': page,
-            'locator': RabbyXPath.CONFIRM_IMPORT,
-        })
-        await self.pw_manager.click({
-            'page': page,
-            'locator': RabbyXPath.DONE_BUTTON,
+            'text': password,
         })
+        await page.keyboard.press('Enter')
+        await expect(page).not_to_have_url(unlock_url)
         await self.pw_manager.close_page(page)
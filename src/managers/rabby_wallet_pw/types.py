@@ -6,6 +6,7 @@ from typing_extensions import NotRequired
 class Config(TypedDict):
     logger: Logger
     store_identificator: str
+    use_controller: NotRequired[bool]
 
 
 class BaseData(TypedDict):
@@ -1,11 +1,70 @@
+from typing import List
+
+from src.managers.playwright.types import FlowStep, RouteRule
+
+
 OPENION_URL = 'https://openion.com'
+OPENION_ACCOUNT_URL = f'{OPENION_URL}/account/active'
+REF_CODE_TIMEOUT = 30
+RABBY_NOTIFICATION_URL = 'chrome-extension://{store_id}/notification.html'
 
 
 class OpenionXPath:
     EXPLORE_MARKETS = '//*[@id="root"]/div/div/div/div[2]/div/section/div/button'
     LOG_IN = '//*[@id="main-content"]/div/div/div[1]/div[2]/div/div/div/div[3]/div/button'
+    RABBY_WALLET = '//*[text()="Rabby Wallet"]'
     RABBY_APPROVAL = '//*[@id="root"]/div/div/div/div/div[3]/div/div/div/span[2]'
     SIGN = '//*[@id="root"]/div/div/div/div/div[3]/div/div/button[1]'
     CONFIRM_SIGN = '//*[@id="root"]/div/footer/div/section/div[2]/div/button'
     
     REF_CODE = '//*[@id="main-content"]/div/div/div/div[3]/div[1]/div[2]/div/div/div/span'
+
+
+# Opening the login dialog doesn't need the wallet yet, picking Rabby in it
+# does
+OPEN_LOG_IN_FLOW: List[FlowStep] = [
+    {'action': 'open_page', 'url': '{url}'},
+    {'action': 'click', 'locator': OpenionXPath.EXPLORE_MARKETS, 'timeout': 1},
+    {'action': 'click', 'locator': OpenionXPath.LOG_IN, 'timeout': 1},
+]
+SELECT_RABBY_WALLET_FLOW: List[FlowStep] = [
+    {'action': 'click', 'locator': OpenionXPath.RABBY_WALLET},
+]
+GET_RABBY_WALLET_FLOW: List[FlowStep] = [
+    *OPEN_LOG_IN_FLOW,
+    *SELECT_RABBY_WALLET_FLOW,
+]
+CONNECT_RABBY_FLOW: List[FlowStep] = [
+    {'action': 'wait_popup', 'url': RABBY_NOTIFICATION_URL, 'timeout': 15},
+    {'action': 'click', 'locator': OpenionXPath.RABBY_APPROVAL, 'timeout': 1},
+    {'action': 'click', 'locator': OpenionXPath.SIGN, 'timeout': 1},
+    {'action': 'close_page'},
+    {
+        'action': 'wait_popup',
+        'url': RABBY_NOTIFICATION_URL + '#/approval',
+        'timeout': 30,
+    },
+    # The signature is confirmed with a real double click, not a DOM click
+    {
+        'action': 'click',
+        'locator': OpenionXPath.CONFIRM_SIGN,
+        'click_count': 2,
+        'trusted': True,
+    },
+]
+
+OPENION_ROUTE_RULES: List[RouteRule] = [
+    {
+        'action': 'block',
+        'url_pattern': (
+            r'google-analytics\.com|googletagmanager\.com|doubleclick\.net'
+            r'|hotjar\.com|segment\.(io|com)|mixpanel\.com|sentry\.io'
+            r'|intercom\.io|facebook\.(net|com)/tr'
+        ),
+    },
+    {
+        'action': 'block',
+        'resource_types': ['image', 'media', 'font'],
+        'url_pattern': r'^https?://([\w-]+\.)*openion\.com/',
+    },
+]
@@ -1,10 +1,22 @@
 import logging
+from typing import Optional
 
-from patchright.async_api import BrowserContext
+from patchright.async_api import BrowserContext, Page
 
 
-from .constants import OpenionXPath
+from .constants import (
+    CONNECT_RABBY_FLOW,
+    GET_RABBY_WALLET_FLOW,
+    OPEN_LOG_IN_FLOW,
+    OPENION_ACCOUNT_URL,
+    REF_CODE_TIMEOUT,
+    SELECT_RABBY_WALLET_FLOW,
+    OpenionXPath,
+)
+from src.deadline import cap_timeout
 from src.managers.playwright.base import PlaywrightManager
+from src.managers.playwright.flow import FlowExecutor
+from src.tracing import traced
 
 
 class Openion:
@@ -20,54 +32,72 @@ class Openion:
             browser_context=browser_context,
             logger=self.logger,
         )
+        self.flow_executor = FlowExecutor(self.pw_manager)
     
-    async def get_rabby_wallet(self) -> None:
-        openion = await self.pw_manager.open_page(url=self.url)
-        
-        await self.pw_manager.click({
-            'page': openion,
-            'locator': OpenionXPath.EXPLORE_MARKETS,
-            'delay_to_wait_element': 1,
-        })
-        await self.pw_manager.click({
-            'page': openion,
-            'locator': OpenionXPath.LOG_IN,
-            'delay_to_wait_element': 1,
-        })
-        await openion.get_by_text('Rabby Wallet', exact=True).click()
-        
+    @traced()
+    async def open_log_in(self) -> Optional[Page]:
+        return await self.flow_executor.run(
+            OPEN_LOG_IN_FLOW,
+            variables={'url': self.url},
+        )
+
+    @traced()
+    async def get_rabby_wallet(
+        self,
+        log_in_page: Optional[Page] = None,
+    ) -> None:
+        if log_in_page:
+            await self.flow_executor.run(
+                SELECT_RABBY_WALLET_FLOW,
+                page=log_in_page,
+            )
+            return
+
+        await self.flow_executor.run(
+            GET_RABBY_WALLET_FLOW,
+            variables={'url': self.url},
+        )
+
+    @traced()
     async def connect_rabby(
         self,
         chrome_store_id: str,
     ) -> None:
-        rabby_popup = f"chrome-extension://{chrome_store_id}/notification.html"
-        
-        extension_page = await self.pw_manager.open_extension_popup(url=rabby_popup)
-        await self.pw_manager.click({
-            'page': extension_page,
-            'locator': OpenionXPath.RABBY_APPROVAL,
-            'delay_to_wait_element': 1,
-        })
-        await self.pw_manager.click({
-            'page': extension_page,
-            'locator': OpenionXPath.SIGN,
-            'delay_to_wait_element': 1,
-        })
-        await self.pw_manager.close_page(extension_page)
-        
-        sign_popup = await self.pw_manager.open_extension_popup(
-            url=rabby_popup + '#/approval',
-            timeout=100
+        await self.flow_executor.run(
+            CONNECT_RABBY_FLOW,
+            variables={'store_id': chrome_store_id},
         )
-        await self.pw_manager.click({
-            'page': sign_popup,
-            'locator': OpenionXPath.CONFIRM_SIGN,
-            'click_count': 2,
-        })
-        
-    async def get_ref_code(self) -> str:
-        account_page = await self.pw_manager.open_page(
-            'https://openion.com/account/active'
+
+    @traced()
+    async def open_account_page(
+        self,
+        page: Optional[Page] = None,
+    ) -> Page:
+        # Loaded while the wallet is still being connected, the ref code is
+        # then read from this page instead of a new navigation
+        if not page:
+            return await self.pw_manager.open_page(OPENION_ACCOUNT_URL)
+
+        await page.goto(
+            OPENION_ACCOUNT_URL,
+            timeout=cap_timeout(REF_CODE_TIMEOUT) * 1000,
+        )
+        return page
+
+    @traced()
+    async def get_ref_code(
+        self,
+        account_page: Optional[Page] = None,
+    ) -> str:
+        if not account_page:
+            account_page = await self.pw_manager.open_page(OPENION_ACCOUNT_URL)
+        ref_code_locator = account_page.locator(OpenionXPath.REF_CODE)
+        if not await ref_code_locator.is_visible():
+            # Preloaded before the wallet was connected and it didn't pick
+            # the connection up on its own
+            await account_page.reload(
+                timeout=cap_timeout(REF_CODE_TIMEOUT) * 1000)
+        ref_code = await ref_code_locator.inner_html(
+            timeout=cap_timeout(REF_CODE_TIMEOUT) * 1000,
         )
-        ref_code = await account_page.locator(OpenionXPath.REF_CODE).inner_html()
         return ref_code
@@ -0,0 +1,127 @@
+import os
+import signal
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def get_children_map() -> Dict[int, List[int]]:
+    children: Dict[int, List[int]] = defaultdict(list)
+
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, fields after it are stable
+        parent_pid = int(stat.rsplit(')', 1)[1].split()[1])
+        children[parent_pid].append(int(entry))
+
+    return children
+
+
+def get_process_tree(pid: int) -> List[int]:
+    children = get_children_map()
+    tree = [pid]
+    index = 0
+
+    while index < len(tree):
+        tree.extend(children.get(tree[index], []))
+        index += 1
+
+    return tree
+
+
+def kill_process_tree(pid: int) -> int:
+    # The root goes first so it can't spawn replacements for its children
+    killed = 0
+    for tree_pid in get_process_tree(pid):
+        try:
+            os.kill(tree_pid, signal.SIGKILL)
+            killed += 1
+        except OSError:
+            pass
+    return killed
+
+
+def get_rss(pid: int) -> int:
+    try:
+        with open(f'/proc/{pid}/statm') as statm_file:
+            return int(statm_file.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def get_process_tree_rss(pid: int) -> int:
+    # An upper bound, pages shared between the processes count once each
+    return sum(get_rss(tree_pid) for tree_pid in get_process_tree(pid))
+
+
+def get_pss(pid: int) -> int:
+    # Shared pages are split between the processes sharing them, so the sum
+    # over a process tree is what the tree really costs
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps_file:
+            for line in smaps_file:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    return get_rss(pid)
+
+
+def get_process_tree_pss(pid: int) -> int:
+    return sum(get_pss(tree_pid) for tree_pid in get_process_tree(pid))
+
+
+def get_cpu_seconds(pid: int) -> float:
+    try:
+        with open(f'/proc/{pid}/stat') as stat_file:
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+    except (OSError, IndexError):
+        return 0
+    # utime and stime, counted from the state field right after the name
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def get_process_tree_cpu_seconds(pid: int) -> float:
+    return sum(get_cpu_seconds(tree_pid) for tree_pid in get_process_tree(pid))
+
+
+def get_system_memory() -> Tuple[int, int]:
+    memory: Dict[str, int] = {}
+    with open('/proc/meminfo') as meminfo_file:
+        for line in meminfo_file:
+            name, value = line.split(':', 1)
+            memory[name] = int(value.split()[0]) * 1024
+    return memory['MemTotal'], memory.get('MemAvailable', memory['MemFree'])
+
+
+def find_browser_pid(user_data_dir: str) -> Optional[int]:
+    marker = f'--user-data-dir={user_data_dir}'.encode()
+    matched: Dict[int, int] = {}
+
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/cmdline', 'rb') as cmdline_file:
+                if marker not in cmdline_file.read().split(b'\0'):
+                    continue
+            with open(f'/proc/{entry}/stat') as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        matched[int(entry)] = int(stat.rsplit(')', 1)[1].split()[1])
+
+    # Helpers inherit the flag, the browser is the one whose parent lacks it
+    for pid, parent_pid in matched.items():
+        if parent_pid not in matched:
+            return pid
+    return None
@@ -0,0 +1,2 @@
+from .runner import AccountRunner
+from .sharding import ShardedRunner
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import time
+from logging import Logger
+from typing import Callable, Optional
+
+from .types import AdmissionConfig
+from src.process_stats import (
+    get_process_tree_cpu_seconds,
+    get_process_tree_pss,
+    get_system_memory,
+)
+
+
+LimitListener = Callable[[int], None]
+
+
+class ResourceSample:
+    def __init__(
+        self,
+        rss: int,
+        cpu: float,
+        available_memory: int,
+    ) -> None:
+        self.rss = rss
+        self.cpu = cpu
+        self.available_memory = available_memory
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        logger: Logger,
+        max_concurrency: int,
+        config: AdmissionConfig,
+        on_limit_change: Optional[LimitListener] = None,
+    ) -> None:
+        self.logger = logger
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = min(
+            self.max_concurrency, max(1, config.get('min_concurrency', 1)))
+        self.rss_budget = config.get('rss_budget_mb', 0) * 1024 * 1024
+        self.min_available_memory = (
+            config.get('min_available_memory_mb', 512) * 1024 * 1024)
+        # Percent of all cores, 100 means every core is busy
+        self.cpu_budget = config.get('cpu_budget', 85)
+        self.sample_interval = config.get('sample_interval', 2)
+        self.on_limit_change = on_limit_change
+
+        self.limit = self.min_concurrency
+        self.running = 0
+        self.is_over_budget = False
+        self.last_sample: Optional[ResourceSample] = None
+        self._changed = asyncio.Condition()
+        self._sampler: Optional[asyncio.Task] = None
+        self._cpu_seconds = 0.0
+        self._sampled_at = 0.0
+
+    def start(self) -> None:
+        self._sampler = asyncio.create_task(self._sample_periodically())
+
+    async def close(self) -> None:
+        if self._sampler:
+            self._sampler.cancel()
+            try:
+                await self._sampler
+            except asyncio.CancelledError:
+                pass
+            self._sampler = None
+
+    async def acquire(self) -> None:
+        async with self._changed:
+            await self._changed.wait_for(self._can_admit)
+            self.running += 1
+
+    async def release(self) -> None:
+        async with self._changed:
+            self.running -= 1
+            self._changed.notify_all()
+
+    def _can_admit(self) -> bool:
+        # Over budget nothing new starts, running jobs are left to finish.
+        # The floor keeps the run moving even on a busy host.
+        if self.running < self.min_concurrency:
+            return True
+        return self.running < self.limit and not self.is_over_budget
+
+    async def _sample_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.sample_interval)
+            try:
+                sample = await asyncio.to_thread(self._sample)
+            except Exception as e:
+                self.logger.warning(f'Error while sampling resources: {e}')
+                continue
+            await self._adjust(sample)
+
+    def _sample(self) -> ResourceSample:
+        # Chromium runs under the Playwright driver, a child of this process
+        pid = os.getpid()
+        cpu_seconds = get_process_tree_cpu_seconds(pid)
+        sampled_at = time.monotonic()
+        cpu = 0.0
+        if self._sampled_at:
+            cpu = (
+                (cpu_seconds - self._cpu_seconds)
+                / (sampled_at - self._sampled_at)
+                / (os.cpu_count() or 1)
+                * 100
+            )
+        self._cpu_seconds, self._sampled_at = cpu_seconds, sampled_at
+
+        _, available_memory = get_system_memory()
+        return ResourceSample(
+            get_process_tree_pss(pid), cpu, available_memory)
+
+    async def _adjust(self, sample: ResourceSample) -> None:
+        self.last_sample = sample
+        per_job = sample.rss / self.running if self.running else 0
+
+        is_over_budget = (
+            sample.available_memory < self.min_available_memory
+            or sample.cpu > self.cpu_budget
+            or bool(self.rss_budget and sample.rss > self.rss_budget)
+        )
+        # Growing needs room for one more job of the current average size
+        has_headroom = (
+            not is_over_budget
+            and sample.available_memory - per_job > self.min_available_memory
+            and sample.cpu < self.cpu_budget * 0.8
+            and not (self.rss_budget and sample.rss + per_job > self.rss_budget)
+        )
+
+        limit = self.limit
+        if is_over_budget:
+            limit = max(self.min_concurrency, min(limit, self.running) - 1)
+        elif has_headroom and self.running >= limit:
+            limit = min(self.max_concurrency, limit + 1)
+
+        if is_over_budget != self.is_over_budget:
+            self.logger.warning(
+                'Resources over budget, pausing admission'
+                if is_over_budget else 'Resources back within budget'
+            )
+
+        async with self._changed:
+            self.is_over_budget = is_over_budget
+            if limit != self.limit:
+                self.logger.info(
+                    f'Concurrency limit {self.limit} -> {limit} '
+                    f'(PSS {sample.rss / 1024 / 1024:.0f} MB, '
+                    f'CPU {sample.cpu:.0f}%, '
+                    f'available {sample.available_memory / 1024 / 1024:.0f} MB)'
+                )
+                self.limit = limit
+                if self.on_limit_change:
+                    self.on_limit_change(limit)
+            self._changed.notify_all()
@@ -0,0 +1,120 @@
+import asyncio
+import sqlite3
+import time
+from logging import Logger
+from typing import Dict, List, Optional, Tuple
+
+
+JournalRow = Tuple[str, str, Optional[str], float]
+
+
+class CheckpointJournal:
+    def __init__(
+        self,
+        path: str,
+        logger: Logger,
+        batch_size: int = 100,
+        flush_interval: float = 1,
+    ) -> None:
+        self.path = path
+        self.logger = logger
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.completed: Dict[str, Dict[str, Optional[str]]] = {}
+        self.pending: List[JournalRow] = []
+        self.connection: Optional[sqlite3.Connection] = None
+        self._flush_requested = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._is_closing = False
+
+    async def open(self) -> None:
+        self.connection = await asyncio.to_thread(self._connect)
+        rows = await asyncio.to_thread(self._load)
+        for account, step, value in rows:
+            self.completed.setdefault(account, {})[step] = value
+
+        self.logger.info(
+            f'Loaded checkpoint journal with {len(self.completed)} accounts')
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    def get_completed(self, account: str) -> Dict[str, Optional[str]]:
+        return dict(self.completed.get(account, {}))
+
+    def record(
+        self,
+        account: str,
+        step: str,
+        value: Optional[str] = None,
+    ) -> None:
+        self.completed.setdefault(account, {})[step] = value
+        self.pending.append((account, step, value, time.time()))
+
+        if len(self.pending) >= self.batch_size:
+            self._flush_requested.set()
+
+    async def close(self) -> None:
+        # The flusher is stopped rather than cancelled, a cancelled commit
+        # would keep running in its thread while the connection closes
+        if self._flusher:
+            self._is_closing = True
+            self._flush_requested.set()
+            await self._flusher
+            self._flusher = None
+
+        await self.flush()
+        if self.connection:
+            await asyncio.to_thread(self.connection.close)
+            self.connection = None
+
+    async def flush(self) -> None:
+        if not self.pending or not self.connection:
+            return
+
+        batch, self.pending = self.pending, []
+        try:
+            await asyncio.to_thread(self._commit, batch)
+        except Exception as e:
+            self.pending = batch + self.pending
+            self.logger.error(f'Error while writing checkpoint journal: {e}')
+
+    async def _flush_periodically(self) -> None:
+        while not self._is_closing:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS steps ('
+            'account TEXT NOT NULL, '
+            'step TEXT NOT NULL, '
+            'value TEXT, '
+            'completed_at REAL NOT NULL, '
+            'PRIMARY KEY (account, step))'
+        )
+        connection.commit()
+        return connection
+
+    def _load(self) -> List[Tuple[str, str, Optional[str]]]:
+        if not self.connection:
+            return []
+        return self.connection.execute(
+            'SELECT account, step, value FROM steps').fetchall()
+
+    def _commit(self, batch: List[JournalRow]) -> None:
+        if not self.connection:
+            return
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO steps '
+                '(account, step, value, completed_at) VALUES (?, ?, ?, ?)',
+                batch,
+            )
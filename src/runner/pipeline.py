@@ -0,0 +1,152 @@
+from logging import Logger
+from typing import Callable, Dict, List, Optional
+
+from patchright.async_api import BrowserContext, Page
+
+from .steps import StepGraph
+from .types import Step
+from src.managers.rabby_wallet_pw.constants import RABBY_STORE_ID
+from src.managers.rabby_wallet_pw.rabby_wallet import RabbyWalletWithPlaywright
+from src.managers.rabby_wallet_pw.types import ParsedWithUserData
+from src.modules.openion_pw.openion import Openion
+from src.tracing import traced
+
+
+# Journaled steps
+IMPORT_STEP = 'import'
+CONNECT_STEP = 'connect'
+REF_CODE_STEP = 'ref_code'
+# Scheduling only steps
+WALLET_STEP = 'wallet'
+START_PAGE_STEP = 'start_page'
+LOG_IN_STEP = 'log_in'
+ACCOUNT_PAGE_STEP = 'account_page'
+
+
+@traced('account')
+async def import_rabby_and_get_ref_code(
+    browser_context: BrowserContext,
+    account: ParsedWithUserData,
+    referral_url: str,
+    logger: Logger,
+    store_identificator: str = RABBY_STORE_ID,
+    is_profile_restored: bool = False,
+    completed_steps: Optional[Dict[str, Optional[str]]] = None,
+    on_step_done: Optional[Callable[[str, Optional[str]], None]] = None,
+    use_rabby_controller: bool = True,
+) -> str:
+    completed_steps = completed_steps or {}
+    if ref_code := completed_steps.get(REF_CODE_STEP):
+        return ref_code
+
+    private_key = account.get('private_key')
+    if not private_key:
+        err_msg = (
+            f'Account {account["serial_number"]} has no private key, '
+            'mnemonic import is not supported'
+        )
+        logger.error(err_msg)
+        raise Exception(err_msg)
+
+    rabby_wallet = RabbyWalletWithPlaywright(
+        config={
+            'logger': logger,
+            'store_identificator': store_identificator,
+            'use_controller': use_rabby_controller,
+        },
+        browser_context=browser_context,
+    )
+    openion = Openion(
+        url=referral_url,
+        browser_context=browser_context,
+        logger=logger,
+    )
+
+    def mark_done(step: str, value: Optional[str] = None) -> None:
+        if on_step_done:
+            on_step_done(step, value)
+
+    # Steps run on their own pages of the context, openion.com loads while
+    # the wallet is still being imported
+    pages: Dict[str, Optional[Page]] = {}
+
+    async def prepare_wallet() -> None:
+        # Completed steps can only be skipped when the restored profile still
+        # holds their result, a fresh profile has to go through them again
+        if is_profile_restored and account.get('password'):
+            await rabby_wallet.unlock(account['password'])
+        else:
+            # Pages other steps have just opened are still blank, the
+            # start page is taken care of by its own step instead
+            await rabby_wallet.import_by_private_key(
+                private_key,
+                password=account.get('password'),
+                close_blank_pages=False,
+            )
+            mark_done(IMPORT_STEP)
+
+    async def open_log_in() -> None:
+        pages['log_in'] = await openion.open_log_in()
+
+    async def connect() -> None:
+        await openion.get_rabby_wallet(pages['log_in'])
+        await openion.connect_rabby(rabby_wallet.store_identificator)
+        mark_done(CONNECT_STEP)
+
+    async def take_start_page() -> None:
+        # The blank page every context starts with is reused for the account
+        # page, any other blank page is left over and closed
+        blank_pages = [
+            page for page in browser_context.pages
+            if page.url == 'about:blank'
+        ]
+        pages['start'] = blank_pages[0] if blank_pages else None
+        for page in blank_pages[1:]:
+            await page.close()
+
+    async def open_account_page() -> None:
+        pages['account'] = await openion.open_account_page(pages['start'])
+
+    async def get_ref_code() -> str:
+        ref_code = await openion.get_ref_code(pages['account'])
+        mark_done(REF_CODE_STEP, ref_code)
+        return ref_code
+
+    # The start page is picked before any other step opens a page of its
+    # own, pages that are still loading look blank too
+    steps: List[Step] = [
+        {'name': START_PAGE_STEP, 'run': take_start_page},
+        {
+            'name': WALLET_STEP,
+            'run': prepare_wallet,
+            'depends_on': [START_PAGE_STEP],
+        },
+        {
+            'name': ACCOUNT_PAGE_STEP,
+            'run': open_account_page,
+            'depends_on': [START_PAGE_STEP],
+        },
+    ]
+    ref_code_dependencies = [WALLET_STEP, ACCOUNT_PAGE_STEP]
+    if not (is_profile_restored and CONNECT_STEP in completed_steps):
+        steps += [
+            {
+                'name': LOG_IN_STEP,
+                'run': open_log_in,
+                'depends_on': [START_PAGE_STEP],
+            },
+            {
+                'name': CONNECT_STEP,
+                'run': connect,
+                'depends_on': [WALLET_STEP, LOG_IN_STEP],
+            },
+        ]
+        ref_code_dependencies.append(CONNECT_STEP)
+    steps.append({
+        'name': REF_CODE_STEP,
+        'run': get_ref_code,
+        'depends_on': ref_code_dependencies,
+    })
+
+    results = await StepGraph(steps, logger).run()
+    return results[REF_CODE_STEP] or ''
@@ -0,0 +1,190 @@
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from logging import Logger
+from typing import Callable, Deque, Dict, List, Optional
+
+from .types import AccountResult
+
+
+RESULT_FIELDS = (
+    'serial_number',
+    'user_id',
+    'is_success',
+    'elapsed',
+    'ref_code',
+    'error',
+)
+
+
+def write_csv(
+    path: str,
+    batch: List[AccountResult],
+) -> None:
+    is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', newline='') as result_file:
+        writer = csv.DictWriter(
+            result_file, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+        if is_new:
+            writer.writeheader()
+        writer.writerows(batch)
+
+
+def write_jsonl(
+    path: str,
+    batch: List[AccountResult],
+) -> None:
+    with open(path, 'a') as result_file:
+        result_file.writelines(json.dumps(result) + '\n' for result in batch)
+
+
+def write_sqlite(
+    path: str,
+    batch: List[AccountResult],
+) -> None:
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'serial_number TEXT, user_id TEXT, is_success INTEGER, '
+                'elapsed REAL, ref_code TEXT, error TEXT, created_at REAL)'
+            )
+            created_at = time.time()
+            connection.executemany(
+                'INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (
+                        result['serial_number'],
+                        result['user_id'],
+                        result['is_success'],
+                        result['elapsed'],
+                        result.get('ref_code'),
+                        result.get('error'),
+                        created_at,
+                    )
+                    for result in batch
+                ],
+            )
+    finally:
+        connection.close()
+
+
+WRITERS: Dict[str, Callable[[str, List[AccountResult]], None]] = {
+    '.csv': write_csv,
+    '.jsonl': write_jsonl,
+    '.db': write_sqlite,
+    '.sqlite': write_sqlite,
+    '.sqlite3': write_sqlite,
+}
+
+
+class ResultSink:
+    def __init__(
+        self,
+        path: str,
+        logger: Logger,
+        batch_size: int = 100,
+        flush_interval: float = 2,
+        max_pending: int = 10000,
+    ) -> None:
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in WRITERS:
+            raise Exception(
+                f'Unsupported result file {path}, '
+                f'expected one of: {", ".join(WRITERS)}'
+            )
+
+        self.path = path
+        self.logger = logger
+        self.writer = WRITERS[extension]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue[AccountResult] = asyncio.Queue(
+            maxsize=max_pending)
+        self.batch: List[AccountResult] = []
+        # Results that didn't fit in the queue, they go in once it has room
+        self.overflow: Deque[AccountResult] = deque()
+        self.written = 0
+        self._consumer: Optional[asyncio.Task] = None
+        self._write_task: Optional[asyncio.Future] = None
+
+    def start(self) -> None:
+        self._consumer = asyncio.create_task(self._consume())
+
+    def put(self, result: AccountResult) -> None:
+        # Workers must never wait on disk, a full queue means the writer is
+        # behind and the result waits in memory until it catches up
+        if not self.overflow:
+            try:
+                self.queue.put_nowait(result)
+                return
+            except asyncio.QueueFull:
+                self.logger.warning(
+                    f'Result queue is full, holding results in memory until '
+                    f'{self.path} catches up'
+                )
+        self.overflow.append(result)
+
+    async def close(self) -> None:
+        if self._consumer:
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
+
+        # A batch handed to the writer thread is finished, never written twice
+        if self._write_task:
+            await asyncio.wait([self._write_task])
+
+        while not self.queue.empty():
+            self.batch.append(self.queue.get_nowait())
+        self.batch.extend(self.overflow)
+        self.overflow.clear()
+        await self._flush()
+
+        self.logger.info(f'Wrote {self.written} results to {self.path}')
+
+    async def _consume(self) -> None:
+        while True:
+            self.batch.append(await self.queue.get())
+            flush_at = time.monotonic() + self.flush_interval
+
+            while len(self.batch) < self.batch_size:
+                if (remaining := flush_at - time.monotonic()) <= 0:
+                    break
+                try:
+                    self.batch.append(
+                        await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush()
+            self._refill()
+
+    def _refill(self) -> None:
+        while self.overflow and not self.queue.full():
+            self.queue.put_nowait(self.overflow.popleft())
+
+    async def _flush(self) -> None:
+        if not self.batch:
+            return
+
+        batch, self.batch = self.batch, []
+        self._write_task = asyncio.ensure_future(
+            asyncio.to_thread(self._write, batch))
+        try:
+            await asyncio.shield(self._write_task)
+        except Exception as e:
+            self.batch = batch + self.batch
+            self.logger.error(f'Error while writing results to {self.path}: {e}')
+
+    def _write(self, batch: List[AccountResult]) -> None:
+        self.writer(self.path, batch)
+        self.written += len(batch)
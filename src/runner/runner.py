@@ -0,0 +1,555 @@
+import asyncio
+import functools
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from weakref import WeakKeyDictionary
+
+from patchright.async_api import BrowserContext, Playwright, ProxySettings
+
+from .admission import AdmissionController
+from .journal import CheckpointJournal
+from .pipeline import REF_CODE_STEP, import_rabby_and_get_ref_code
+from .result_sink import ResultSink
+from .types import AccountResult, RunnerConfig
+from src.deadline import deadline, is_deadline_exceeded
+from src.managers.playwright import (
+    AssetCache,
+    ContextPool,
+    FingerprintPool,
+    PlaywrightManager,
+    ProfileStore,
+    ProfileTemplate,
+    ProxyPool,
+    RequestRouter,
+)
+from src.managers.playwright.context_pool import ProfileHook
+from src.managers.playwright.launch_profiles import get_launch_options
+from src.managers.playwright.proxy_pool import is_proxy_error
+from src.managers.playwright.types import Fingerprint
+from src.managers.rabby_wallet_pw.constants import RABBY_STORE_ID
+from src.managers.rabby_wallet_pw.types import ParsedWithUserData
+from src.modules.openion_pw.constants import OPENION_ROUTE_RULES
+from src.process_stats import (
+    find_browser_pid,
+    get_process_tree_pss,
+    kill_process_tree,
+)
+from src.tracing import Tracer, current_account, percentile, set_tracer
+
+
+T = TypeVar('T')
+
+
+class AccountTimeout(Exception):
+    pass
+
+
+def get_account_key(account: ParsedWithUserData) -> str:
+    return f'{account["serial_number"]}_{account["user_id"]}'
+
+
+def get_account_identity(account: ParsedWithUserData) -> str:
+    # Serial numbers are only positions in the input, the wallet secret is
+    # what tells two runs' accounts apart
+    secret = account.get('private_key') or account.get('mnemonic') or ''
+    digest = hashlib.sha256(secret.encode()).hexdigest()[:16]
+    return f'{get_account_key(account)}_{digest}'
+
+
+class AccountRunner:
+    def __init__(
+        self,
+        playwright: Playwright,
+        config: RunnerConfig,
+    ) -> None:
+        self.playwright = playwright
+        self.logger = config['logger']
+        self.extension_path = config['extension_path']
+        self.referral_url = config['referral_url']
+        self.workers = max(1, config.get('workers', 1))
+        self.launch_profile = config.get('launch_profile', 'default')
+        self.launch_options = get_launch_options(
+            self.launch_profile, self.extension_path)
+        if 'headless' in config:
+            self.launch_options['headless'] = config['headless']
+        self.measure_memory = config.get('measure_memory', False)
+        self.account_timeout = config.get('account_timeout', 0)
+        self.account_retries = config.get('account_retries', 1)
+        self.context_rss: List[int] = []
+        self._browser_pids: 'WeakKeyDictionary[BrowserContext, int]' = (
+            WeakKeyDictionary())
+        self.user_data_root = config.get('user_data_root')
+        self.store_identificator = config.get(
+            'store_identificator', RABBY_STORE_ID)
+        self.use_rabby_controller = config.get('use_rabby_controller', True)
+        self.profile_template = (
+            ProfileTemplate(config['profile_template_dir'], self.logger)
+            if config.get('profile_template_dir') else None
+        )
+        self.profile_store = (
+            ProfileStore(config['profile_store_dir'], self.logger)
+            if config.get('profile_store_dir') else None
+        )
+        self._is_passwordless_warned = False
+        self.router: Optional[RequestRouter] = None
+        # Any context route turns Chromium's HTTP cache off for that context,
+        # every page load then downloads the scripts and styles again. The
+        # asset cache takes over caching them, so blocking is only on by
+        # default next to it.
+        block_resources = config.get('block_resources')
+        if block_resources is None:
+            block_resources = bool(config.get('asset_cache_dir'))
+        if block_resources:
+            if not config.get('asset_cache_dir'):
+                self.logger.warning(
+                    'Request routing without an asset cache turns the HTTP '
+                    'cache off, every page load downloads all its assets'
+                )
+            self.router = RequestRouter(self.logger)
+            self.router.add_rules('openion', OPENION_ROUTE_RULES)
+        self.asset_cache = (
+            AssetCache(
+                config['asset_cache_dir'],
+                self.logger,
+                max_bytes=config.get('asset_cache_max_mb', 512) * 1024 * 1024,
+                index_name=config.get('asset_cache_index', 'index.json'),
+            )
+            if config.get('asset_cache_dir') else None
+        )
+        self.proxy_pool = ProxyPool(
+            self.logger,
+            proxies=config.get('proxies', []),
+            proxy_type=config.get('proxy_type'),
+            probe_target=config.get('proxy_probe_target', 'openion.com:443'),
+        )
+        self.fingerprint_pool = (
+            FingerprintPool(config['fingerprint_cache_path'], self.logger)
+            if config.get('fingerprint_cache_path') else None
+        )
+        self.trace_path = config.get('trace_path')
+        self.journal = (
+            CheckpointJournal(config['journal_path'], self.logger)
+            if config.get('journal_path') else None
+        )
+        self.result_sink = (
+            ResultSink(config['result_path'], self.logger)
+            if config.get('result_path') else None
+        )
+        self.on_context_launch = config.get('on_context_launch')
+        self.on_result = config.get('on_result')
+        # With admission control `workers` is the upper bound, the controller
+        # decides how many of them run at a time
+        self.admission = (
+            AdmissionController(
+                self.logger,
+                max_concurrency=self.workers,
+                config=config['admission'],
+                on_limit_change=self._resize_pool,
+            )
+            if config.get('admission') else None
+        )
+        self.is_pool_started = False
+        self._resizing: Optional[asyncio.Task] = None
+        # Every account imports its own wallet into the extension storage,
+        # so by default a context is replaced rather than reused
+        self.pool = ContextPool(
+            launcher=self._launch_context,
+            logger=self.logger,
+            config={
+                'size': self.admission.limit if self.admission else self.workers,
+                'max_uses': config.get('max_context_uses', 1),
+                'reset_mode': config.get('context_reset_mode', 'replace'),
+                'user_data_root': self.user_data_root,
+            },
+            profile_template=self.profile_template,
+        )
+
+    async def run(
+        self,
+        accounts: Union[
+            Iterable[ParsedWithUserData],
+            AsyncIterable[ParsedWithUserData],
+        ],
+    ) -> List[AccountResult]:
+        queue: asyncio.Queue[Optional[ParsedWithUserData]] = asyncio.Queue(
+            maxsize=self.workers * 2,
+        )
+        results: List[AccountResult] = []
+        started_at = time.monotonic()
+
+        self.logger.info(f'Starting runner with {self.workers} workers...')
+        tracer = Tracer(self.trace_path) if self.trace_path else None
+        set_tracer(tracer)
+        if self.journal:
+            await self.journal.open()
+        if self.result_sink:
+            self.result_sink.start()
+        await self.build_profile_template()
+        await self.proxy_pool.start()
+        if self.fingerprint_pool:
+            await asyncio.to_thread(
+                self.fingerprint_pool.load,
+                self.playwright.chromium.executable_path,
+            )
+        # With shared proxies or fingerprints every account launches its own
+        # browser, warm contexts would never be used
+        if not self.proxy_pool.shared and not self.fingerprint_pool:
+            await self.pool.start()
+            self.is_pool_started = True
+        if self.admission:
+            self.admission.start()
+
+        workers = [
+            asyncio.create_task(self._worker(worker_id, queue, results))
+            for worker_id in range(self.workers)
+        ]
+        try:
+            if isinstance(accounts, AsyncIterable):
+                async for account in accounts:
+                    await queue.put(account)
+            else:
+                for account in accounts:
+                    await queue.put(account)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            if self.admission:
+                await self.admission.close()
+            if self._resizing:
+                await asyncio.gather(self._resizing, return_exceptions=True)
+            await self.pool.close()
+            await self.proxy_pool.close()
+            if self.result_sink:
+                await self.result_sink.close()
+            if self.journal:
+                await self.journal.close()
+            if tracer:
+                set_tracer(None)
+                tracer.close()
+
+        elapsed = time.monotonic() - started_at
+        succeeded = sum(1 for result in results if result['is_success'])
+        per_hour = len(results) / elapsed * 3600 if elapsed else 0
+        self.logger.info(
+            f'Processed {len(results)} accounts ({succeeded} succeeded) '
+            f'in {elapsed:.1f} seconds, {per_hour:.0f} accounts per hour'
+        )
+        if self.router:
+            self.router.report()
+        self.proxy_pool.report()
+        if self.context_rss:
+            self._report_context_rss()
+        if self.asset_cache:
+            self.asset_cache.report()
+            self.asset_cache.save_index()
+        return results
+
+    async def build_profile_template(self) -> None:
+        if self.profile_template and not self.profile_template.is_ready():
+            await self.profile_template.build(self._launch_context)
+
+    async def _worker(
+        self,
+        worker_id: int,
+        queue: 'asyncio.Queue[Optional[ParsedWithUserData]]',
+        results: List[AccountResult],
+    ) -> None:
+        while True:
+            if self.admission:
+                await self.admission.acquire()
+            try:
+                if (account := await queue.get()) is None:
+                    return
+
+                self.logger.info(
+                    f'Worker {worker_id} took account {account["serial_number"]}')
+                result = await self._process_account(account)
+                # The stuck context is gone by now, the retry gets a new one
+                # and resumes from the journal
+                for retry in range(self.account_retries):
+                    if not result.get('is_timed_out'):
+                        break
+                    self.logger.warning(
+                        f'Retrying account {account["serial_number"]} '
+                        f'({retry + 1} of {self.account_retries})'
+                    )
+                    result = await self._process_account(account)
+                results.append(result)
+                if self.on_result:
+                    self.on_result(result)
+                # Skipped accounts were written by the run that completed them
+                if self.result_sink and not result.get('is_skipped'):
+                    self.result_sink.put(result)
+            finally:
+                if self.admission:
+                    await self.admission.release()
+
+    def _resize_pool(self, size: int) -> None:
+        if not self.is_pool_started:
+            return
+
+        previous = self._resizing
+
+        async def resize() -> None:
+            if previous:
+                await asyncio.gather(previous, return_exceptions=True)
+            await self.pool.resize(size)
+
+        self._resizing = asyncio.create_task(resize())
+
+    async def _process_account(
+        self,
+        account: ParsedWithUserData,
+    ) -> AccountResult:
+        started_at = time.monotonic()
+        current_account.set(account['serial_number'])
+        key = get_account_identity(account)
+        completed_steps = self.journal.get_completed(key) if self.journal else {}
+
+        if ref_code := completed_steps.get(REF_CODE_STEP):
+            self.logger.info(
+                f'Account {account["serial_number"]} is already completed')
+            return {
+                'serial_number': account['serial_number'],
+                'user_id': account['user_id'],
+                'is_success': True,
+                'elapsed': 0,
+                'ref_code': ref_code,
+                'is_skipped': True,
+            }
+
+        restore, persist = self._get_profile_hooks(key, account)
+        on_step_done = (
+            (lambda step, value: journal.record(key, step, value))
+            if (journal := self.journal) else None
+        )
+
+        proxy: Optional[ProxySettings] = None
+        try:
+            proxy = await self.proxy_pool.acquire(
+                key, account.get('proxy'), account.get('proxy_type'))
+            fingerprint = (
+                self.fingerprint_pool.get(account['serial_number'])
+                if self.fingerprint_pool else None
+            )
+            launcher = (
+                functools.partial(
+                    self._launch_context, proxy=proxy, fingerprint=fingerprint)
+                if proxy or fingerprint else None
+            )
+            async with self.pool.acquire(restore, persist, launcher) as context:
+                async with self._measure_rss(context) as peak_rss:
+                    ref_code = await self._run_with_deadline(
+                        context,
+                        import_rabby_and_get_ref_code(
+                            browser_context=context,
+                            account=account,
+                            referral_url=self.referral_url,
+                            logger=self.logger,
+                            store_identificator=self.store_identificator,
+                            is_profile_restored=restore is not None,
+                            completed_steps=completed_steps,
+                            on_step_done=on_step_done,
+                            use_rabby_controller=self.use_rabby_controller,
+                        ),
+                    )
+            if proxy:
+                self.proxy_pool.report_success(proxy)
+            result: AccountResult = {
+                'serial_number': account['serial_number'],
+                'user_id': account['user_id'],
+                'is_success': True,
+                'elapsed': time.monotonic() - started_at,
+                'ref_code': ref_code,
+            }
+            if peak_rss:
+                result['peak_rss'] = peak_rss[0]
+            return result
+        except AccountTimeout as e:
+            self.logger.error(
+                f'Account {account["serial_number"]} timed out: {e}')
+            return {
+                'serial_number': account['serial_number'],
+                'user_id': account['user_id'],
+                'is_success': False,
+                'elapsed': time.monotonic() - started_at,
+                'error': str(e),
+                'is_timed_out': True,
+            }
+        except Exception as e:
+            if proxy and is_proxy_error(e):
+                self.proxy_pool.report_failure(proxy)
+            self.logger.error(
+                f'Account {account["serial_number"]} failed: {e}')
+            return {
+                'serial_number': account['serial_number'],
+                'user_id': account['user_id'],
+                'is_success': False,
+                'elapsed': time.monotonic() - started_at,
+                'error': str(e),
+            }
+        finally:
+            self.proxy_pool.release(key)
+
+    async def _run_with_deadline(
+        self,
+        context: BrowserContext,
+        job: Awaitable[T],
+    ) -> T:
+        if not self.account_timeout:
+            return await job
+
+        # Created inside the deadline scope, so the job and every task it
+        # starts see the same budget
+        with deadline(self.account_timeout) as deadline_at:
+            task = asyncio.ensure_future(job)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.account_timeout)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+        if done:
+            if task.cancelled():
+                raise Exception('Account job was cancelled')
+            # Steps give up on their own once the budget is spent, usually
+            # before the deadline itself, that is still a timeout worth
+            # retrying. Calls that time out without a retry policy only
+            # show it on the clock.
+            if (error := task.exception()) and (
+                is_deadline_exceeded(error)
+                or time.monotonic() >= deadline_at
+            ):
+                raise AccountTimeout(
+                    f'Account ran out of its {self.account_timeout} seconds: '
+                    f'{error}'
+                ) from error
+            return task.result()
+
+        # Killing the browser first fails every pending driver call, so the
+        # cancelled job unwinds right away instead of waiting on a hung page
+        await self._kill_browser(context)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        raise AccountTimeout(
+            f'Account took longer than {self.account_timeout} seconds')
+
+    async def _kill_browser(
+        self,
+        context: BrowserContext,
+    ) -> None:
+        if pid := self._browser_pids.get(context):
+            killed = await asyncio.to_thread(kill_process_tree, pid)
+            self.logger.warning(
+                f'Killed {killed} browser processes of a stuck context')
+            return
+
+        self.logger.warning('Browser pid is unknown, closing stuck context')
+        try:
+            await asyncio.wait_for(context.close(), self.pool.close_timeout)
+        except Exception as e:
+            self.logger.warning(f'Error while closing stuck context: {e!r}')
+
+    def _get_profile_hooks(
+        self,
+        key: str,
+        account: ParsedWithUserData,
+    ) -> Tuple[Optional[ProfileHook], Optional[ProfileHook]]:
+        if not (store := self.profile_store):
+            return None, None
+        # A stored wallet can only be unlocked with the password it was
+        # imported with, and the one generated for these accounts is never
+        # kept anywhere
+        if not account.get('password'):
+            if not self._is_passwordless_warned:
+                self._is_passwordless_warned = True
+                self.logger.warning(
+                    'Profiles of accounts without a password are not stored')
+            return None, None
+
+        restore = (
+            (lambda user_data_dir: store.restore(key, user_data_dir))
+            if store.has(key) else None
+        )
+        return restore, lambda user_data_dir: store.save(key, user_data_dir)
+
+    @asynccontextmanager
+    async def _measure_rss(
+        self,
+        context: BrowserContext,
+    ) -> AsyncIterator[List[int]]:
+        peak_rss: List[int] = []
+        pid = self._browser_pids.get(context)
+        if not self.measure_memory or not pid:
+            yield peak_rss
+            return
+
+        async def sample() -> None:
+            peak_rss.append(0)
+            while True:
+                rss = await asyncio.to_thread(get_process_tree_pss, pid)
+                peak_rss[0] = max(peak_rss[0], rss)
+                await asyncio.sleep(1)
+
+        sampler = asyncio.create_task(sample())
+        try:
+            yield peak_rss
+        finally:
+            sampler.cancel()
+            if peak_rss and peak_rss[0]:
+                self.context_rss.append(peak_rss[0])
+                self.logger.debug(
+                    f'Context peak PSS {peak_rss[0] / 1024 / 1024:.0f} MB')
+
+    def _report_context_rss(self) -> None:
+        megabytes = [rss / 1024 / 1024 for rss in self.context_rss]
+        self.logger.info(
+            f'Per-context peak PSS with {self.launch_profile} launch profile: '
+            f'avg {sum(megabytes) / len(megabytes):.0f} MB, '
+            f'p95 {percentile(megabytes, 95):.0f} MB, '
+            f'max {max(megabytes):.0f} MB over {len(megabytes)} contexts'
+        )
+
+    async def _launch_context(
+        self,
+        user_data_dir: str,
+        proxy: Optional[ProxySettings] = None,
+        fingerprint: Optional[Fingerprint] = None,
+    ) -> BrowserContext:
+        context = await self.playwright.chromium.launch_persistent_context(
+            user_data_dir=user_data_dir,
+            channel='chromium',
+            proxy=proxy,
+            **{**self.launch_options, **(fingerprint or {})},
+        )
+        if self.measure_memory or self.account_timeout:
+            if pid := await asyncio.to_thread(
+                find_browser_pid, os.path.abspath(user_data_dir)
+            ):
+                self._browser_pids[context] = pid
+        pw_manager = PlaywrightManager(context, self.logger)
+        # Routes are matched in reverse order, so the router registered last
+        # decides first and only lets unblocked requests reach the cache
+        if self.asset_cache:
+            await pw_manager.enable_asset_cache(self.asset_cache)
+        if self.on_context_launch:
+            await self.on_context_launch(context)
+        if self.router:
+            await pw_manager.enable_routing(self.router)
+        return context
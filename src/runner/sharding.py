@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing.process import BaseProcess
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from patchright.async_api import async_playwright
+
+from .journal import CheckpointJournal
+from .result_sink import ResultSink
+from .runner import AccountRunner, get_account_identity, get_account_key
+from .types import AccountResult, RunnerConfig
+from src.logging_setup import AccountContextFilter
+from src.managers.playwright import FingerprintPool
+from src.managers.rabby_wallet_pw.types import ParsedWithUserData
+
+
+# Playwright and Chromium do not survive a fork, so shards are always spawned
+_mp = multiprocessing.get_context('spawn')
+
+ShardMessage = Tuple[Any, ...]
+# Accounts of a chunk with their journaled steps, keyed by account identity
+ShardChunk = Tuple[
+    List[ParsedWithUserData], Dict[str, Dict[str, Optional[str]]]]
+# How often shard processes are checked for crashes, busy or not
+SHARD_CHECK_INTERVAL = 1
+
+
+def get_shard_path(path: str, shard_id: int) -> str:
+    root, extension = os.path.splitext(path.rstrip(os.sep))
+    return f'{root}.shard{shard_id}{extension}'
+
+
+def run_shard(
+    shard_id: int,
+    config: Dict[str, Any],
+    logger_name: str,
+    inbox: 'multiprocessing.Queue[Optional[ShardChunk]]',
+    messages: 'multiprocessing.Queue[ShardMessage]',
+    log_queue: 'multiprocessing.Queue[logging.LogRecord]',
+) -> None:
+    # Records go to the parent, which owns the real handlers
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(AccountContextFilter())
+    logger = logging.getLogger(logger_name)
+    logger.handlers = [queue_handler]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+    config['logger'] = logger
+    config['on_result'] = (
+        lambda result: messages.put(('result', shard_id, result)))
+    asyncio.run(_run_shard(shard_id, config, inbox, messages))
+    messages.put(('done', shard_id))
+
+
+class ShardJournal:
+    # Stands in for CheckpointJournal in a shard. The parent owns the file,
+    # hands out completed steps with every chunk and records new ones.
+    def __init__(
+        self,
+        shard_id: int,
+        messages: 'multiprocessing.Queue[ShardMessage]',
+    ) -> None:
+        self.shard_id = shard_id
+        self.messages = messages
+        self.completed: Dict[str, Dict[str, Optional[str]]] = {}
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def get_completed(self, account: str) -> Dict[str, Optional[str]]:
+        return dict(self.completed.get(account, {}))
+
+    def record(
+        self,
+        account: str,
+        step: str,
+        value: Optional[str] = None,
+    ) -> None:
+        self.completed.setdefault(account, {})[step] = value
+        self.messages.put(('step', self.shard_id, account, step, value))
+
+
+async def _run_shard(
+    shard_id: int,
+    config: RunnerConfig,
+    inbox: 'multiprocessing.Queue[Optional[ShardChunk]]',
+    messages: 'multiprocessing.Queue[ShardMessage]',
+) -> None:
+    journal = ShardJournal(shard_id, messages)
+    async with async_playwright() as pw:
+        runner = AccountRunner(playwright=pw, config=config)
+        runner.journal = journal  # type: ignore[assignment]
+        await runner.run(_pull_accounts(shard_id, inbox, messages, journal))
+
+
+async def _pull_accounts(
+    shard_id: int,
+    inbox: 'multiprocessing.Queue[Optional[ShardChunk]]',
+    messages: 'multiprocessing.Queue[ShardMessage]',
+    journal: ShardJournal,
+) -> AsyncIterator[ParsedWithUserData]:
+    # Work is pulled chunk by chunk, so a shard that gets through its
+    # accounts faster simply asks for more
+    while True:
+        messages.put(('ready', shard_id))
+        if (chunk := await asyncio.to_thread(inbox.get)) is None:
+            return
+        accounts, completed = chunk
+        journal.completed.update(completed)
+        for account in accounts:
+            yield account
+
+
+class Shard:
+    def __init__(
+        self,
+        shard_id: int,
+        process: BaseProcess,
+        inbox: 'multiprocessing.Queue[Optional[ShardChunk]]',
+    ) -> None:
+        self.shard_id = shard_id
+        self.process = process
+        self.inbox = inbox
+        self.in_flight: Dict[str, ParsedWithUserData] = {}
+        self.is_done = False
+
+
+class ShardedRunner:
+    def __init__(
+        self,
+        config: RunnerConfig,
+        shards: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ) -> None:
+        self.config = config
+        self.logger = config['logger']
+        self.shards = max(1, shards or os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size or config.get('workers', 1))
+        self.max_restarts = self.shards
+
+        self._shards: Dict[int, Shard] = {}
+        self._messages: 'multiprocessing.Queue[ShardMessage]' = _mp.Queue()
+        self._log_queue: 'multiprocessing.Queue[logging.LogRecord]' = _mp.Queue()
+        self._retry: Dict[str, ParsedWithUserData] = {}
+        self._accounts: Optional[Iterator[ParsedWithUserData]] = None
+        self._journal = (
+            CheckpointJournal(config['journal_path'], self.logger)
+            if config.get('journal_path') else None
+        )
+        self._restarts = 0
+        self._succeeded = 0
+
+    async def run(
+        self,
+        accounts: Iterable[ParsedWithUserData],
+    ) -> List[AccountResult]:
+        results: List[AccountResult] = []
+        started_at = time.monotonic()
+        self._accounts = iter(accounts)
+
+        # Every shard would race to build the shared template and the
+        # fingerprint cache otherwise
+        async with async_playwright() as pw:
+            await AccountRunner(
+                playwright=pw, config=self._get_parent_config(),
+            ).build_profile_template()
+            executable_path = pw.chromium.executable_path
+        if fingerprint_cache_path := self.config.get('fingerprint_cache_path'):
+            await asyncio.to_thread(
+                FingerprintPool(fingerprint_cache_path, self.logger).load,
+                executable_path,
+            )
+
+        result_sink = (
+            ResultSink(self.config['result_path'], self.logger)
+            if self.config.get('result_path') else None
+        )
+        listener = QueueListener(
+            self._log_queue, *self.logger.handlers, respect_handler_level=True)
+
+        self.logger.info(f'Starting {self.shards} shards...')
+        listener.start()
+        if result_sink:
+            result_sink.start()
+        if self._journal:
+            await self._journal.open()
+        try:
+            for shard_id in range(self.shards):
+                self._start_shard(shard_id)
+
+            checked_at = time.monotonic()
+            while any(not shard.is_done for shard in self._shards.values()):
+                # Checked on a timer, a busy queue must not hide a crash
+                if time.monotonic() - checked_at >= SHARD_CHECK_INTERVAL:
+                    self._check_shards()
+                    checked_at = time.monotonic()
+                try:
+                    message = await asyncio.to_thread(
+                        self._messages.get, True, SHARD_CHECK_INTERVAL)
+                except queue.Empty:
+                    continue
+
+                if result := self._handle(message):
+                    results.append(result)
+                    self._succeeded += result['is_success']
+                    if result_sink and not result.get('is_skipped'):
+                        result_sink.put(result)
+                    self._log_progress(message[1], result, len(results))
+        finally:
+            for shard in self._shards.values():
+                if shard.process.is_alive():
+                    shard.process.terminate()
+                await asyncio.to_thread(shard.process.join)
+            if result_sink:
+                await result_sink.close()
+            if self._journal:
+                await self._journal.close()
+            listener.stop()
+
+        if self._retry:
+            self.logger.error(
+                f'{len(self._retry)} accounts were left unprocessed after '
+                f'{self._restarts} shard restarts'
+            )
+        elapsed = time.monotonic() - started_at
+        per_hour = len(results) / elapsed * 3600 if elapsed else 0
+        self.logger.info(
+            f'Processed {len(results)} accounts ({self._succeeded} succeeded) '
+            f'with {self.shards} shards in {elapsed:.1f} seconds, '
+            f'{per_hour:.0f} accounts per hour'
+        )
+        return results
+
+    def _handle(self, message: ShardMessage) -> Optional[AccountResult]:
+        kind, shard_id = message[0], message[1]
+        shard = self._shards[shard_id]
+
+        if kind == 'ready':
+            chunk = self._next_chunk()
+            completed: Dict[str, Dict[str, Optional[str]]] = {}
+            for account in chunk:
+                shard.in_flight[get_account_key(account)] = account
+                if self._journal and (steps := self._journal.get_completed(
+                    identity := get_account_identity(account)
+                )):
+                    completed[identity] = steps
+            shard.inbox.put((chunk, completed) if chunk else None)
+        elif kind == 'step':
+            if self._journal:
+                self._journal.record(*message[2:])
+        elif kind == 'result':
+            result: AccountResult = message[2]
+            key = f'{result["serial_number"]}_{result["user_id"]}'
+            shard.in_flight.pop(key, None)
+            # A late result from a crashed shard, no need to run it again
+            self._retry.pop(key, None)
+            return result
+        elif kind == 'done':
+            shard.is_done = True
+        return None
+
+    def _next_chunk(self) -> List[ParsedWithUserData]:
+        chunk: List[ParsedWithUserData] = []
+
+        while self._retry and len(chunk) < self.chunk_size:
+            chunk.append(self._retry.pop(next(iter(self._retry))))
+        if self._accounts and len(chunk) < self.chunk_size:
+            for account in self._accounts:
+                chunk.append(account)
+                if len(chunk) >= self.chunk_size:
+                    break
+            else:
+                self._accounts = None
+
+        return chunk
+
+    def _check_shards(self) -> None:
+        for shard in list(self._shards.values()):
+            # A clean exit is followed by its `done` message
+            if shard.is_done or shard.process.exitcode in (None, 0):
+                continue
+
+            shard.is_done = True
+            self.logger.error(
+                f'Shard {shard.shard_id} exited with code '
+                f'{shard.process.exitcode}, '
+                f'requeueing {len(shard.in_flight)} accounts'
+            )
+            self._retry.update(shard.in_flight)
+            shard.in_flight.clear()
+
+            if self._retry and self._restarts < self.max_restarts:
+                self._restarts += 1
+                self._start_shard(max(self._shards) + 1)
+
+    def _start_shard(self, shard_id: int) -> None:
+        inbox: 'multiprocessing.Queue[Optional[ShardChunk]]' = _mp.Queue()
+        process = _mp.Process(
+            target=run_shard,
+            args=(
+                shard_id,
+                self._get_shard_config(shard_id),
+                self.logger.name,
+                inbox,
+                self._messages,
+                self._log_queue,
+            ),
+            name=f'shard-{shard_id}',
+            daemon=True,
+        )
+        process.start()
+        self._shards[shard_id] = Shard(shard_id, process, inbox)
+
+    def _get_parent_config(self) -> RunnerConfig:
+        config: RunnerConfig = {**self.config}
+        config.pop('result_path', None)
+        return config
+
+    def _get_shard_config(self, shard_id: int) -> Dict[str, Any]:
+        # Callables in the config have to be importable module-level
+        # functions to reach the shard
+        config: Dict[str, Any] = {**self._get_parent_config()}
+        config.pop('logger')
+        config.pop('on_result', None)
+        # The journal is written by the parent only. The asset cache and the
+        # profile store stay shared: blobs are content-addressed and written
+        # atomically. Every shard writes an asset index of its own and loads
+        # all of them. A profile manifest belongs to one account, an account
+        # is in flight in one shard at a time and a resumed account may land
+        # in any shard.
+        config.pop('journal_path', None)
+        if trace_path := config.get('trace_path'):
+            config['trace_path'] = get_shard_path(trace_path, shard_id)
+        if config.get('asset_cache_dir'):
+            config['asset_cache_index'] = f'index.shard{shard_id}.json'
+        return config
+
+    def _log_progress(
+        self,
+        shard_id: int,
+        result: AccountResult,
+        done: int,
+    ) -> None:
+        in_flight = sum(
+            len(shard.in_flight) for shard in self._shards.values())
+        self.logger.info(
+            f'Shard {shard_id} finished account {result["serial_number"]}: '
+            f'{done} done ({self._succeeded} succeeded), '
+            f'{in_flight} in flight'
+        )
@@ -0,0 +1,69 @@
+import asyncio
+from logging import Logger
+from typing import Dict, List, Optional
+
+from .types import Step
+
+
+class StepGraph:
+    def __init__(
+        self,
+        steps: List[Step],
+        logger: Logger,
+    ) -> None:
+        self.steps = {step['name']: step for step in steps}
+        self.logger = logger
+        self._check()
+
+    async def run(self) -> Dict[str, Optional[str]]:
+        # Every step starts right away and only waits for its own
+        # dependencies, so the account takes as long as its critical path
+        tasks: Dict[str, 'asyncio.Task[Optional[str]]'] = {}
+
+        async def run_step(step: Step) -> Optional[str]:
+            for dependency in step.get('depends_on', []):
+                await tasks[dependency]
+            self.logger.debug('Starting step %s', step['name'])
+            return await step['run']()
+
+        for name, step in self.steps.items():
+            tasks[name] = asyncio.create_task(run_step(step), name=name)
+
+        try:
+            done, _ = await asyncio.wait(
+                tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled() and (error := task.exception()):
+                    raise error
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        return {name: task.result() for name, task in tasks.items()}
+
+    def _check(self) -> None:
+        for step in self.steps.values():
+            for dependency in step.get('depends_on', []):
+                if dependency not in self.steps:
+                    err_msg = (
+                        f'Step {step["name"]} depends on unknown step '
+                        f'{dependency}'
+                    )
+                    self.logger.error(err_msg)
+                    raise Exception(err_msg)
+
+        # Steps waiting on each other in a cycle would never start
+        remaining = {
+            name: set(step.get('depends_on', []))
+            for name, step in self.steps.items()
+        }
+        while ready := [name for name, deps in remaining.items() if not deps]:
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        if remaining:
+            err_msg = f'Steps {", ".join(remaining)} depend on each other'
+            self.logger.error(err_msg)
+            raise Exception(err_msg)
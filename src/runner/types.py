@@ -0,0 +1,67 @@
+from logging import Logger
+from typing import Awaitable, Callable, List, Literal, Optional, TypedDict
+from typing_extensions import NotRequired
+
+from patchright.async_api import BrowserContext
+
+
+class AdmissionConfig(TypedDict):
+    min_concurrency: NotRequired[int]
+    rss_budget_mb: NotRequired[int]
+    min_available_memory_mb: NotRequired[int]
+    cpu_budget: NotRequired[float]
+    sample_interval: NotRequired[float]
+
+
+class Step(TypedDict):
+    name: str
+    run: Callable[[], Awaitable[Optional[str]]]
+    depends_on: NotRequired[List[str]]
+
+
+class AccountResult(TypedDict):
+    serial_number: str
+    user_id: str
+    is_success: bool
+    elapsed: float
+    ref_code: NotRequired[str]
+    error: NotRequired[str]
+    is_skipped: NotRequired[bool]
+    is_timed_out: NotRequired[bool]
+    # Bytes of proportional set size (PSS), shared pages split between
+    # the processes sharing them
+    peak_rss: NotRequired[int]
+
+
+class RunnerConfig(TypedDict):
+    logger: Logger
+    extension_path: str
+    referral_url: str
+    workers: NotRequired[int]
+    admission: NotRequired[AdmissionConfig]
+    headless: NotRequired[bool]
+    launch_profile: NotRequired[Literal['default', 'lean']]
+    measure_memory: NotRequired[bool]
+    account_timeout: NotRequired[float]
+    account_retries: NotRequired[int]
+    user_data_root: NotRequired[str]
+    store_identificator: NotRequired[str]
+    use_rabby_controller: NotRequired[bool]
+    max_context_uses: NotRequired[int]
+    context_reset_mode: NotRequired[Literal['reset', 'replace']]
+    profile_template_dir: NotRequired[str]
+    profile_store_dir: NotRequired[str]
+    block_resources: NotRequired[bool]
+    asset_cache_dir: NotRequired[str]
+    asset_cache_max_mb: NotRequired[int]
+    # File name of this process's index in the asset cache directory
+    asset_cache_index: NotRequired[str]
+    proxies: NotRequired[List[str]]
+    proxy_type: NotRequired[str]
+    proxy_probe_target: NotRequired[str]
+    fingerprint_cache_path: NotRequired[str]
+    trace_path: NotRequired[str]
+    journal_path: NotRequired[str]
+    result_path: NotRequired[str]
+    on_context_launch: NotRequired[Callable[[BrowserContext], Awaitable[None]]]
+    on_result: NotRequired[Callable[[AccountResult], None]]
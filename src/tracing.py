@@ -0,0 +1,173 @@
+import argparse
+import functools
+import json
+import math
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    TypeVar,
+)
+
+
+T = TypeVar('T')
+
+current_account: ContextVar[Optional[str]] = ContextVar(
+    'current_account', default=None)
+_current_span: ContextVar[Optional['Span']] = ContextVar(
+    'current_span', default=None)
+_tracer: Optional['Tracer'] = None
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        parent: Optional['Span'] = None,
+    ) -> None:
+        self.name = name
+        self.parent = parent
+        self.account = current_account.get()
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.attempts = 0
+        self.sleep_seconds = 0.0
+
+    def to_record(
+        self,
+        outcome: str,
+        error: Optional[BaseException] = None,
+    ) -> Dict[str, Any]:
+        duration = time.perf_counter() - self.started
+        return {
+            'name': self.name,
+            'parent': self.parent.name if self.parent else None,
+            'account': self.account,
+            'start': self.started_at,
+            'end': self.started_at + duration,
+            'duration': duration,
+            'attempts': self.attempts,
+            'sleep_seconds': self.sleep_seconds,
+            'wait_seconds': max(0.0, duration - self.sleep_seconds),
+            'outcome': outcome,
+            'error': str(error) if error else None,
+        }
+
+
+class Tracer:
+    def __init__(
+        self,
+        path: str,
+    ) -> None:
+        self.path = path
+        self.file: TextIO = open(path, 'a', buffering=64 * 1024)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.file.write(json.dumps(record) + '\n')
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def set_tracer(tracer: Optional[Tracer]) -> None:
+    global _tracer
+    _tracer = tracer
+
+
+def record_attempt() -> None:
+    if span := _current_span.get():
+        span.attempts += 1
+
+
+def record_sleep(seconds: float) -> None:
+    span = _current_span.get()
+    while span:
+        span.sleep_seconds += seconds
+        span = span.parent
+
+
+def traced(
+    name: Optional[str] = None,
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    def decorator(
+        func: Callable[..., Awaitable[T]],
+    ) -> Callable[..., Awaitable[T]]:
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            if not (tracer := _tracer):
+                return await func(*args, **kwargs)
+
+            span = Span(span_name, _current_span.get())
+            token = _current_span.set(span)
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException as e:
+                tracer.write(span.to_record('error', e))
+                raise
+            finally:
+                _current_span.reset(token)
+
+            tracer.write(span.to_record('ok'))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def percentile(
+    values: List[float],
+    rank: float,
+) -> float:
+    ordered = sorted(values)
+    index = max(0, math.ceil(rank / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def load_step_durations(
+    path: str,
+) -> Tuple[Dict[str, List[float]], Dict[str, int]]:
+    durations: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+
+    with open(path) as trace_file:
+        for line in trace_file:
+            record = json.loads(line)
+            durations[record['name']].append(record['duration'])
+            if record['outcome'] != 'ok':
+                errors[record['name']] += 1
+
+    return durations, errors
+
+
+def summarize(path: str) -> None:
+    durations, errors = load_step_durations(path)
+
+    print(
+        f'{"step":<28}{"count":>8}{"errors":>8}'
+        f'{"p50":>10}{"p95":>10}{"p99":>10}'
+    )
+    for name, values in sorted(durations.items()):
+        print(
+            f'{name:<28}{len(values):>8}{errors[name]:>8}'
+            f'{percentile(values, 50):>10.3f}'
+            f'{percentile(values, 95):>10.3f}'
+            f'{percentile(values, 99):>10.3f}'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Print p50/p95/p99 step durations from a JSONL trace')
+    parser.add_argument('trace_path')
+    summarize(parser.parse_args().trace_path)
@@ -1,7 +1,12 @@
 import asyncio
 import logging
+import os
 import random
-from typing import Optional
+import tempfile
+from typing import Optional, Union
+
+from src.logging_setup import CHATTER
+from src.tracing import record_sleep
 
 
 async def sleep(
@@ -9,12 +14,15 @@ async def sleep(
     inner_logger: Optional[logging.Logger] = None,
     custom_msg: Optional[str] = None,
 ) -> None:
-    wait_msg = f'Sleeping for {seconds} seconds...'
-    log_msg = f'{custom_msg}. {wait_msg}' if custom_msg else wait_msg
-    
     if (logger := inner_logger):
-        logger.info(log_msg)
-        
+        if custom_msg:
+            logger.info(
+                '%s. Sleeping for %s seconds...', custom_msg, seconds,
+                extra=CHATTER)
+        else:
+            logger.info('Sleeping for %s seconds...', seconds, extra=CHATTER)
+
+    record_sleep(seconds)
     await asyncio.sleep(seconds)
 
 
@@ -26,3 +34,26 @@ async def sleep_by_range(
     min_delay, max_delay = delay
     delay_to_sleep = random.uniform(min_delay, max_delay)
     await sleep(delay_to_sleep, logger, custom_msg)
+
+
+def write_atomic(
+    path: str,
+    data: Union[bytes, str],
+) -> None:
+    # Every write gets its own temporary file, concurrent writers of the same
+    # path in one process would otherwise replace each other's
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.',
+        prefix=f'.{os.path.basename(path)}.',
+        suffix='.tmp',
+    )
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -1,5 +1,4 @@
 import asyncio
-from fake_useragent import UserAgent
 
 from patchright.sync_api import sync_playwright, expect
 from patchright.async_api import async_playwright, expect
@@ -70,6 +69,8 @@ async def antidetect_work():
                 '--start-maximized'
             ]
         )
+        # fake_useragent loads its whole dataset on import
+        from fake_useragent import UserAgent
         user_agent = UserAgent().random
         print('UA полученный: ', user_agent)
         
@@ -101,4 +102,5 @@ async def check_is_automated():
         await browser.close()
 
 
-asyncio.run(antidetect_work())
+if __name__ == '__main__':
+    asyncio.run(antidetect_work())